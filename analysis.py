@@ -0,0 +1,44 @@
+import pandas as pd
+
+import lap_index
+import race_matrix
+
+
+def calculate_stint_statistics(laps_data):
+    lap_time = lap_index.seconds_column('LapTime')
+    if lap_time not in laps_data.columns:
+        laps_data = laps_data.assign(**{lap_time: laps_data['LapTime'].dt.total_seconds()})
+    stint_stats = laps_data.groupby('Stint', observed=True).agg({
+        lap_time: ['count', 'mean', 'std', 'min', 'max'],
+        'Compound': lambda x: x.iloc[0],
+        'TyreLife': ['min', 'max'],
+        'SpeedI1': 'mean',
+        'SpeedI2': 'mean',
+        'SpeedFL': 'mean'
+    })
+    return stint_stats
+
+
+def _seconds(laps_data, column):
+    seconds = lap_index.seconds_column(column)
+    if seconds in laps_data.columns:
+        return laps_data[seconds]
+    return laps_data[column].dt.total_seconds()
+
+
+def analyze_sector_performance(laps_data):
+    sector_times = pd.DataFrame({
+        'Sector 1': _seconds(laps_data, 'Sector1Time'),
+        'Sector 2': _seconds(laps_data, 'Sector2Time'),
+        'Sector 3': _seconds(laps_data, 'Sector3Time')
+    })
+    return sector_times.describe()
+
+
+def calculate_tire_degradation(laps_data):
+    degradation = laps_data.groupby(['Compound', 'TyreLife'], observed=True)['LapTime'].mean().reset_index()
+    return degradation
+
+
+def battle_analysis(session_data, driver1, driver2):
+    return race_matrix.for_session(session_data).pair(driver1, driver2)
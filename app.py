@@ -1,16 +1,24 @@
 import streamlit as st
 import fastf1
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from datetime import datetime
-import time
-from utils import plot_speed_trace, analyze_sector_performance, get_latest_session, load_session_data
+
+import charts
+import fragments
+import lap_index
+import lap_overlay
+import pace
+import race_matrix
+import prefetch
+import profiling
+import session_index
+import startup
+import session_loader
+from utils import plot_speed_trace, get_latest_session, load_session_data
 
 fastf1.Cache.enable_cache('cache')
 
+run_profile = profiling.start_run('app.py')
+
 st.set_page_config(
     page_title="Aman's Formula 1 Analyser",
     page_icon="🏎️",
@@ -19,35 +27,9 @@ st.set_page_config(
 
 st.title("🏎️ Aman's Formula 1 Analyser - Analytics Project")
 
-st.markdown("### Select Parameters")
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    years = list(range(2024, 2017, -1))
-    selected_year = st.selectbox("Year", years, index=0)
-
-with col2:
-    try:
-        schedule = fastf1.get_event_schedule(selected_year)
-        races = schedule['EventName'].tolist()
-        latest_race_index = 0
-        for idx, race in enumerate(races):
-            session, _ = get_latest_session(selected_year, race)
-            if session is not None:
-                latest_race_index = idx
-                break
-        selected_race = st.selectbox("Circuit", races, index=latest_race_index)
-    except Exception as e:
-        st.error(f"Error loading race schedule: {str(e)}")
-        st.stop()
-
-latest_session, session_type_name = get_latest_session(selected_year, selected_race)
-
-with col3:
-    session_types = ['Race', 'Qualifying', 'Sprint', 'Practice 3', 'Practice 2', 'Practice 1']
-    default_index = session_types.index(session_type_name) if session_type_name in session_types else 0
-    selected_session = st.selectbox("Session", session_types, index=default_index)
+startup.start()
 
+SESSION_TYPES = ['Race', 'Qualifying', 'Sprint', 'Practice 3', 'Practice 2', 'Practice 1']
 session_mapping = {
     'Race': 'R',
     'Qualifying': 'Q',
@@ -57,229 +39,229 @@ session_mapping = {
     'Practice 1': 'FP1'
 }
 
-with st.spinner('Loading session data...'):
-    session = load_session_data(selected_year, selected_race, session_mapping[selected_session])
-
-    if session is not None:
-        drivers = pd.unique(session.laps['Driver']).tolist()
-        constructors = pd.unique(session.laps['Team']).tolist()
-
-        st.markdown("### Select Competitors")
-        col1, col2, col3, col4 = st.columns(4)
-
-        with col1:
-            primary_driver = st.selectbox("Primary Driver", drivers, index=0)
-        with col2:
-            primary_constructor = st.selectbox("Primary Constructor", constructors, index=0)
-        with col3:
-            secondary_drivers = st.multiselect(
-                "Secondary Driver(s)",
-                [d for d in drivers if d != primary_driver],
-                default=[drivers[1]] if len(drivers) > 1 else []
-            )
-        with col4:
-            secondary_constructors = st.multiselect(
-                "Secondary Constructor(s)",
-                [c for c in constructors if c != primary_constructor],
-                default=[constructors[1]] if len(constructors) > 1 else []
-            )
-
-        st.divider()
-
-        st.header("1. Basic Session Analysis")
-
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.subheader("Driver Position Progression")
-            st.caption("Track position changes throughout the session")
-
-            if selected_session == "Race":
-                position_fig = go.Figure()
-                position_fig.add_trace(go.Scatter(
-                    x=session.laps.pick_driver(primary_driver)['LapNumber'],
-                    y=session.laps.pick_driver(primary_driver)['Position'],
-                    name=primary_driver,
-                    line=dict(color='red', width=3)
-                ))
-
-                for driver in secondary_drivers:
-                    position_fig.add_trace(go.Scatter(
-                        x=session.laps.pick_driver(driver)['LapNumber'],
-                        y=session.laps.pick_driver(driver)['Position'],
-                        name=driver,
-                        line=dict(width=2)
-                    ))
-
-                position_fig.update_layout(
-                    yaxis_autorange="reversed",
-                    yaxis_title="Position",
-                    xaxis_title="Lap Number"
-                )
-                st.plotly_chart(position_fig, use_container_width=True)
-            else:
-                st.info("Position progression is only available for race sessions")
-
-        with col2:
-            st.subheader("Lap Time Distribution")
-            st.caption("Distribution of lap times showing consistency and outliers")
-
-            laptimes_fig = go.Figure()
-            primary_laps = session.laps.pick_driver(primary_driver)['LapTime'].dt.total_seconds()
-
-            laptimes_fig.add_trace(go.Histogram(
-                x=primary_laps,
-                name=primary_driver,
-                nbinsx=30,
-                opacity=0.7
-            ))
-
-            for driver in secondary_drivers:
-                driver_laps = session.laps.pick_driver(driver)['LapTime'].dt.total_seconds()
-                laptimes_fig.add_trace(go.Histogram(
-                    x=driver_laps,
-                    name=driver,
-                    nbinsx=30,
-                    opacity=0.5
-                ))
-
-            laptimes_fig.update_layout(
-                barmode='overlay',
-                xaxis_title="Lap Time (seconds)",
-                yaxis_title="Count"
-            )
-            st.plotly_chart(laptimes_fig, use_container_width=True)
-
-        st.header("2. Sector Analysis")
-
-        col1, col2 = st.columns(2)
-
-        with col1:
-            st.subheader("Sector Times Comparison")
-            st.caption("Detailed breakdown of sector performance")
-
-            sector_fig = go.Figure()
-            primary_sectors = session.laps.pick_driver(primary_driver)
-
-            sectors = ['Sector1Time', 'Sector2Time', 'Sector3Time']
-            for sector in sectors:
-                sector_fig.add_trace(go.Box(
-                    y=primary_sectors[sector].dt.total_seconds(),
-                    name=f"{primary_driver} {sector[:-4]}",
-                    boxpoints='outliers'
-                ))
-
-            for driver in secondary_drivers:
-                driver_sectors = session.laps.pick_driver(driver)
-                for sector in sectors:
-                    sector_fig.add_trace(go.Box(
-                        y=driver_sectors[sector].dt.total_seconds(),
-                        name=f"{driver} {sector[:-4]}",
-                        boxpoints='outliers'
-                    ))
-
-            st.plotly_chart(sector_fig, use_container_width=True)
-
-        with col2:
-            st.subheader("Speed Analysis")
-            st.caption("Speed comparison across different track sections")
-
-            speed_fig = make_subplots(rows=3, cols=1,
-                                      subplot_titles=('Speed Trap 1', 'Speed Trap 2', 'Finish Line'))
-
-            primary_laps = session.laps.pick_driver(primary_driver)
-            speed_metrics = ['SpeedI1', 'SpeedI2', 'SpeedFL']
-
-            for idx, metric in enumerate(speed_metrics, 1):
-                speed_fig.add_trace(
-                    go.Box(y=primary_laps[metric], name=primary_driver,
-                           boxpoints='outliers'), row=idx, col=1
-                )
-
-                for driver in secondary_drivers:
-                    driver_laps = session.laps.pick_driver(driver)
-                    speed_fig.add_trace(
-                        go.Box(y=driver_laps[metric], name=driver,
-                               boxpoints='outliers'), row=idx, col=1
-                    )
-
-            speed_fig.update_layout(height=800, showlegend=False)
-            st.plotly_chart(speed_fig, use_container_width=True)
-
-        st.header("3. Advanced Telemetry")
-
-        st.subheader("Detailed Lap Analysis")
-        st.caption("Comprehensive telemetry data for selected laps")
-
-        col1, col2 = st.columns([1, 3])
-
-        with col1:
-            primary_laps = session.laps.pick_driver(primary_driver)
-            selected_lap = st.selectbox(
-                "Select Lap Number",
-                options=primary_laps['LapNumber'].astype(int).tolist(),
-                index=len(primary_laps['LapNumber']) // 2
-            )
-
-        with col2:
-            telemetry_fig = plot_speed_trace(primary_laps, selected_lap)
-            if telemetry_fig is not None:
-                st.plotly_chart(telemetry_fig, use_container_width=True)
+
+@fragments.fragment('parameters')
+def parameters():
+    st.markdown("### Select Parameters")
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        years = list(range(2024, 2017, -1))
+        selected_year = st.selectbox("Year", years, index=0)
+
+    with col2:
+        with profiling.span('schedule'):
+            try:
+                schedule = session_index.get_schedule(selected_year)
+                races = schedule['EventName'].tolist()
+                session_index.refresh(selected_year, schedule)
+                latest_race_index = session_index.first_available_race(selected_year, races)
+                selected_race = st.selectbox("Circuit", races, index=latest_race_index)
+            except Exception as e:
+                st.error(f"Error loading race schedule: {str(e)}")
+                st.stop()
+
+    with profiling.span('latest_session'):
+        _, session_type_name = get_latest_session(selected_year, selected_race)
+
+    with col3:
+        default_index = SESSION_TYPES.index(session_type_name) if session_type_name in SESSION_TYPES else 0
+        selected_session = st.selectbox("Session", SESSION_TYPES, index=default_index)
+
+    return fragments.publish('parameters', (selected_year, selected_race, selected_session))
+
+
+@fragments.fragment('competitors')
+def competitors(session):
+    drivers = pd.unique(session.laps['Driver']).tolist()
+    constructors = pd.unique(session.laps['Team']).tolist()
+
+    st.markdown("### Select Competitors")
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        primary_driver = st.selectbox("Primary Driver", drivers, index=0)
+    with col2:
+        primary_constructor = st.selectbox("Primary Constructor", constructors, index=0)
+    with col3:
+        secondary_drivers = st.multiselect(
+            "Secondary Driver(s)",
+            [d for d in drivers if d != primary_driver],
+            default=[drivers[1]] if len(drivers) > 1 else []
+        )
+    with col4:
+        secondary_constructors = st.multiselect(
+            "Secondary Constructor(s)",
+            [c for c in constructors if c != primary_constructor],
+            default=[constructors[1]] if len(constructors) > 1 else []
+        )
+
+    return fragments.publish('competitors', (primary_driver, tuple(secondary_drivers),
+                                             primary_constructor, tuple(secondary_constructors)))
+
+
+@fragments.fragment('basic')
+def basic_analysis(session, inputs):
+    _, _, selected_session, primary_driver, secondary_drivers = inputs
+    laps_by_driver = lap_index.for_session(session)
+
+    st.header("1. Basic Session Analysis")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("Driver Position Progression")
+        st.caption("Track position changes throughout the session")
 
         if selected_session == "Race":
-            st.header("4. Race Pace Analysis")
+            position_fig = fragments.figure('basic', inputs, 'position', lambda: charts.position_progression(
+                laps_by_driver, primary_driver, secondary_drivers))
+            st.plotly_chart(position_fig, use_container_width=True)
+        else:
+            st.info("Position progression is only available for race sessions")
+
+    with col2:
+        st.subheader("Lap Time Distribution")
+        st.caption("Distribution of lap times showing consistency and outliers")
+
+        laptimes_fig = fragments.figure('basic', inputs, 'laptimes', lambda: charts.lap_time_distribution(
+            laps_by_driver, primary_driver, secondary_drivers))
+        st.plotly_chart(laptimes_fig, use_container_width=True)
+
+
+@fragments.fragment('sectors')
+def sector_analysis(session, inputs):
+    _, _, _, primary_driver, secondary_drivers = inputs
+    laps_by_driver = lap_index.for_session(session)
+
+    st.header("2. Sector Analysis")
+
+    col1, col2 = st.columns(2)
 
-            col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Sector Times Comparison")
+        st.caption("Detailed breakdown of sector performance")
 
-            with col1:
-                st.subheader("Rolling Race Pace")
-                st.caption("5-lap rolling average pace comparison")
+        sector_fig = fragments.figure('sectors', inputs, 'sectors', lambda: charts.sector_times(
+            laps_by_driver, primary_driver, secondary_drivers))
+        st.plotly_chart(sector_fig, use_container_width=True)
 
-                pace_fig = go.Figure()
-                primary_pace = session.laps.pick_driver(primary_driver)['LapTime'].dt.total_seconds()
-                pace_fig.add_trace(go.Scatter(
-                    x=session.laps.pick_driver(primary_driver)['LapNumber'],
-                    y=primary_pace.rolling(window=5).mean(),
-                    name=primary_driver,
-                    line=dict(color='red', width=3)
-                ))
+    with col2:
+        st.subheader("Speed Analysis")
+        st.caption("Speed comparison across different track sections")
 
-                for driver in secondary_drivers:
-                    driver_pace = session.laps.pick_driver(driver)['LapTime'].dt.total_seconds()
-                    pace_fig.add_trace(go.Scatter(
-                        x=session.laps.pick_driver(driver)['LapNumber'],
-                        y=driver_pace.rolling(window=5).mean(),
-                        name=driver
-                    ))
+        speed_fig = fragments.figure('sectors', inputs, 'speed', lambda: charts.speed_traps(
+            laps_by_driver, primary_driver, secondary_drivers))
+        st.plotly_chart(speed_fig, use_container_width=True)
 
-                st.plotly_chart(pace_fig, use_container_width=True)
 
-            with col2:
-                st.subheader("Gap Evolution")
-                st.caption("Time gap evolution to race leader")
+@fragments.fragment('telemetry')
+def telemetry_analysis(session, inputs):
+    selected_year, selected_race, selected_session, primary_driver, secondary_drivers = inputs
+    laps_by_driver = lap_index.for_session(session)
 
-                if len(secondary_drivers) > 0:
-                    gap_fig = go.Figure()
-                    reference_driver = secondary_drivers[0]
+    st.header("3. Advanced Telemetry")
 
-                    lap_times_ref = session.laps.pick_driver(reference_driver)['LapTime'].dt.total_seconds()
-                    lap_times_primary = session.laps.pick_driver(primary_driver)['LapTime'].dt.total_seconds()
+    with st.spinner('Loading telemetry...'), profiling.span('telemetry_load'):
+        load_session_data(selected_year, selected_race, session_mapping[selected_session],
+                          session_loader.requirements('telemetry'))
 
-                    cumulative_gap = (lap_times_primary - lap_times_ref).cumsum()
+    st.subheader("Detailed Lap Analysis")
+    st.caption("Comprehensive telemetry data for selected laps")
 
-                    gap_fig.add_trace(go.Scatter(
-                        x=session.laps.pick_driver(primary_driver)['LapNumber'],
-                        y=cumulative_gap,
-                        name=f"{primary_driver} vs {reference_driver}",
-                        line=dict(color='red', width=3)
-                    ))
+    col1, col2 = st.columns([1, 3])
 
-                    st.plotly_chart(gap_fig, use_container_width=True)
-                else:
-                    st.info("Select secondary drivers to view gap evolution")
+    with col1:
+        primary_laps = laps_by_driver.driver(primary_driver)
+        selected_lap = st.selectbox(
+            "Select Lap Number",
+            options=primary_laps['LapNumber'].astype(int).tolist(),
+            index=len(primary_laps['LapNumber']) // 2
+        )
 
+    with col2:
+        telemetry_fig = fragments.figure('telemetry', inputs, ('speed_trace', selected_lap),
+                                         lambda: plot_speed_trace(primary_laps, selected_lap))
+        if telemetry_fig is not None:
+            st.plotly_chart(telemetry_fig, use_container_width=True)
+
+    st.subheader("Driver Comparison")
+    st.caption("Telemetry of all selected drivers on a common distance grid, with the time delta to "
+               f"{primary_driver}")
+
+    compared_laps = st.radio("Compare", ["Fastest laps", f"Lap {selected_lap}"], horizontal=True)
+    drivers = [primary_driver] + list(secondary_drivers)
+    if compared_laps == "Fastest laps":
+        pairs = lap_overlay.fastest_laps(session, drivers)
+    else:
+        pairs = [(driver, selected_lap) for driver in drivers]
+
+    def build_comparison():
+        # resampled laps are cached per (driver, lap), so only new laps are computed
+        comparison = lap_overlay.compare(session, pairs)
+        return charts.telemetry_comparison(comparison) if comparison is not None else None
+
+    comparison_fig = fragments.figure('telemetry', inputs, ('comparison', tuple(pairs)), build_comparison)
+    if comparison_fig is not None:
+        st.plotly_chart(comparison_fig, use_container_width=True)
     else:
-        st.error("Failed to load session data")
-        st.stop()
+        st.info(f"No telemetry for the selected laps of {primary_driver}")
+
+
+@fragments.fragment('race_pace')
+def race_pace_analysis(session, inputs):
+    _, _, _, primary_driver, secondary_drivers = inputs
+
+    st.header("4. Race Pace Analysis")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("Rolling Race Pace")
+        st.caption("5-lap rolling average pace comparison, without pit and safety car laps")
+
+        pace_fig = fragments.figure('race_pace', inputs, 'pace', lambda: charts.rolling_pace(
+            pace.for_session(session), primary_driver, secondary_drivers))
+        st.plotly_chart(pace_fig, use_container_width=True)
+
+    with col2:
+        st.subheader("Gap Evolution")
+        st.caption("Time gap evolution to race leader")
+
+        gap_fig = fragments.figure('race_pace', inputs, 'gap', lambda: charts.gap_evolution(
+            race_matrix.for_session(session), primary_driver, secondary_drivers))
+        st.plotly_chart(gap_fig, use_container_width=True)
+
+
+selected_year, selected_race, selected_session = parameters()
+
+with st.spinner('Loading session data...'), profiling.span('session_load'):
+    session = load_session_data(selected_year, selected_race, session_mapping[selected_session],
+                                session_loader.requirements('competitors', 'basic', 'sectors'))
+
+if session is None:
+    st.error("Failed to load session data")
+    st.stop()
+
+prefetch.prefetch_around(selected_year, selected_race, session_mapping[selected_session])
+
+primary_driver, secondary_drivers, _, _ = competitors(session)
+
+st.divider()
+
+# what every analysis section depends on; their cached figures are reused
+# for as long as this stays the same
+inputs = (selected_year, selected_race, selected_session, primary_driver, secondary_drivers)
+
+basic_analysis(session, inputs)
+sector_analysis(session, inputs)
+telemetry_analysis(session, inputs)
+if selected_session == "Race":
+    race_pace_analysis(session, inputs)
+
+st.caption("Created by Aman")
 
-st.caption("Created by Aman")
\ No newline at end of file
+show_profile = st.sidebar.checkbox("Show profiling", value=profiling.PANEL)
+profile_record = run_profile.finish()
+if show_profile:
+    profiling.render_panel(profile_record)
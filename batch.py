@@ -0,0 +1,171 @@
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+
+import fastf1
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import degradation
+import lap_index
+import season_cube
+import session_index
+import session_loader
+from analysis import calculate_stint_statistics, analyze_sector_performance, calculate_tire_degradation, battle_analysis
+
+_logger = logging.getLogger(__name__)
+
+# Season-wide reports, written as Hive-partitioned Parquet:
+#   <output>/<analysis>/year=<year>/event=<event>/session=<type>/part-0.parquet
+# A session counts as done once its marker exists, so an interrupted run picks
+# up where it stopped.
+OUTPUT_DIR = 'reports'
+ANALYSES = ('stints', 'sectors', 'tire_degradation', 'degradation_rates', 'battles')
+
+
+def _slug(race):
+    return str(race).replace(' ', '_')
+
+
+def _marker(output, year, race, session_type):
+    return os.path.join(output, '_done', f"{year}_{_slug(race)}_{session_type}")
+
+
+def season_sessions(year, session_types):
+    schedule = fastf1.get_event_schedule(year, include_testing=False)
+    sessions = []
+    for _, event in schedule.iterrows():
+        available = {session_index.SESSION_TYPES.get(event.get(f'Session{i}')) for i in range(1, 6)}
+        for session_type in session_types:
+            if session_type in available:
+                sessions.append((year, event['EventName'], session_type))
+    return sessions
+
+
+def _load_session(year, race, session_type):
+    return session_loader.load(year, race, session_type, session_loader.requirements('stints', 'battles'))
+
+
+def _flatten(df):
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = ['_'.join(c.replace('<lambda>', 'first') for c in col if c)
+                      for col in df.columns]
+    return df
+
+
+def degradation_rates(session):
+    model = degradation.for_session(session)
+    return model.stints.merge(model.compounds[['Compound', 'Rate']].rename(columns={'Rate': 'CompoundRate'}),
+                              on='Compound', how='left')
+
+
+def analyse_session(session):
+    laps_by_driver = lap_index.for_session(session)
+    results = {name: [] for name in ANALYSES}
+
+    for driver in laps_by_driver.drivers:
+        driver_laps = laps_by_driver.driver(driver)
+        if driver_laps.empty:
+            continue
+
+        stints = _flatten(calculate_stint_statistics(driver_laps)).reset_index()
+        stints.insert(0, 'Driver', driver)
+        results['stints'].append(stints)
+
+        sectors = analyze_sector_performance(driver_laps).rename_axis('Statistic').reset_index()
+        sectors.insert(0, 'Driver', driver)
+        results['sectors'].append(sectors)
+
+        tire_deg = calculate_tire_degradation(driver_laps)
+        tire_deg['LapTime'] = tire_deg['LapTime'].dt.total_seconds()
+        tire_deg.insert(0, 'Driver', driver)
+        results['tire_degradation'].append(tire_deg)
+
+    results['degradation_rates'].append(degradation_rates(session))
+
+    # head-to-head between team mates
+    for team in laps_by_driver.teams:
+        team_drivers = pd.unique(laps_by_driver.team(team)['Driver'])
+        for driver1, driver2 in combinations(team_drivers, 2):
+            battle = battle_analysis(session, driver1, driver2)
+            battle.insert(0, 'Driver2', driver2)
+            battle.insert(0, 'Driver1', driver1)
+            results['battles'].append(battle)
+
+    return {name: pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            for name, frames in results.items()}
+
+
+def _write(output, name, year, race, session_type, df):
+    path = os.path.join(output, name, f"year={year}", f"event={_slug(race)}",
+                        f"session={session_type}")
+    os.makedirs(path, exist_ok=True)
+    target = os.path.join(path, 'part-0.parquet')
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), target + '.tmp')
+    os.replace(target + '.tmp', target)
+
+
+def run_session(year, race, session_type, output=OUTPUT_DIR):
+    session = _load_session(year, race, session_type)
+    for name, df in analyse_session(session).items():
+        _write(output, name, year, race, session_type, df)
+    season_cube.add_session(session, year, race, session_type, force=True)
+
+    marker = _marker(output, year, race, session_type)
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    open(marker, 'w').close()
+    return year, race, session_type
+
+
+def _init_worker(cache_dir):
+    fastf1.Cache.enable_cache(cache_dir)
+    fastf1.set_log_level('WARNING')
+
+
+def run_seasons(years, session_types=('R',), output=OUTPUT_DIR, workers=None,
+                cache_dir='cache', force=False):
+    fastf1.Cache.enable_cache(cache_dir)
+
+    pending = []
+    for year in years:
+        for task in season_sessions(year, session_types):
+            if force or not os.path.exists(_marker(output, *task)):
+                pending.append(task)
+
+    done, failed = [], []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cache_dir,)) as pool:
+        futures = {pool.submit(run_session, *task, output=output): task for task in pending}
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                done.append(future.result())
+                _logger.info(f"Finished {task}")
+            except Exception as e:
+                failed.append(task)
+                _logger.warning(f"Failed {task}: {e}")
+    return done, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the session analyses over whole seasons.")
+    parser.add_argument('years', nargs='+', type=int)
+    parser.add_argument('--sessions', nargs='+', default=['R'], choices=session_index.SESSION_ORDER)
+    parser.add_argument('--output', default=OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache', default='cache')
+    parser.add_argument('--force', action='store_true', help="recompute sessions that are already done")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    done, failed = run_seasons(args.years, args.sessions, args.output, args.workers,
+                               args.cache, args.force)
+    print(f"{len(done)} sessions done, {len(failed)} failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Container cold-start benchmark: import time of the heavy dependencies and of
+# each entry point's own modules, plus the time to the first full render of
+# the Streamlit scripts. Every measurement runs in a fresh interpreter so
+# nothing is already imported or cached in memory.
+MODULES = ['streamlit', 'fastf1', 'pandas', 'pyarrow.parquet', 'plotly.graph_objects',
+           'plotly.subplots', 'plotly.express', 'utils', 'analysis', 'session_loader']
+SCRIPTS = ['app.py', 'main.py']
+
+_IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+_RENDER_SNIPPET = """
+import json, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+app = AppTest.from_file({script!r}, default_timeout={timeout})
+app.run()
+done = time.perf_counter()
+print(json.dumps({{'import_seconds': imported - start, 'render_seconds': done - imported,
+                  'exceptions': [str(e.message) for e in app.exception],
+                  'errors': [str(e.value) for e in app.error]}}))
+"""
+
+
+def _run(code, timeout):
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True,
+                            text=True, timeout=timeout,
+                            env=dict(os.environ, F1_READY_PORT='0'))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else 'failed')
+    return result.stdout.strip().splitlines()[-1]
+
+
+def time_import(module, timeout=120):
+    return float(_run(_IMPORT_SNIPPET.format(module=module), timeout))
+
+
+def time_first_render(script, timeout=600):
+    return json.loads(_run(_RENDER_SNIPPET.format(script=script, timeout=timeout), timeout + 60))
+
+
+def run(modules=MODULES, scripts=SCRIPTS, repeat=3):
+    results = {'python': sys.version.split()[0], 'timestamp': time.time(),
+               'imports': {}, 'first_render': {}}
+    for module in modules:
+        try:
+            results['imports'][module] = min(time_import(module) for _ in range(repeat))
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            results['imports'][module] = {'error': str(e)}
+    for script in scripts:
+        try:
+            results['first_render'][script] = time_first_render(script)
+        except (RuntimeError, subprocess.TimeoutExpired, ValueError) as e:
+            results['first_render'][script] = {'error': str(e)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import and first-render time.")
+    parser.add_argument('--modules', nargs='*', default=MODULES)
+    parser.add_argument('--scripts', nargs='*', default=SCRIPTS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None, help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.modules, args.scripts, args.repeat)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
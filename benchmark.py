@@ -0,0 +1,394 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+# Offline benchmark of the analysis pipeline over the sessions checked in under
+# cache/. The fixtures are copied to a scratch directory first so that neither
+# fastf1 nor the session store writes into the repository while it runs.
+FIXTURE_DIR = 'cache'
+SESSION_SLOTS = {'FP1': 1, 'FP2': 2, 'FP3': 3, 'S': 4, 'Q': 4, 'R': 5}
+
+# A timing only counts as a regression when it is both relatively and
+# absolutely slower than the baseline, so sub-millisecond noise is ignored.
+TOLERANCE = 0.25
+MIN_DELTA = 0.002
+
+# The fixtures carry timing data only; car and position data are generated
+# at this rate so that the telemetry paths have something to work on.
+SYNTHETIC_HZ = 4
+TELEMETRY_DRIVERS = 3
+
+
+def discover_fixtures(fixture_dir=FIXTURE_DIR):
+    import session_index
+
+    fixtures = []
+    for year in sorted(os.listdir(fixture_dir)):
+        year_dir = os.path.join(fixture_dir, year)
+        if not (year.isdigit() and os.path.isdir(year_dir)):
+            continue
+        for event_dir in sorted(os.listdir(year_dir)):
+            event_path = os.path.join(year_dir, event_dir)
+            if not os.path.isdir(event_path):
+                continue
+            for session_dir in sorted(os.listdir(event_path)):
+                session_type = session_index.SESSION_TYPES.get(session_index._strip_date(session_dir))
+                if session_type is None:
+                    continue
+                fixtures.append({
+                    'year': int(year),
+                    'race': session_index._strip_date(event_dir),
+                    'session_type': session_type,
+                    'event_date': event_dir[:10],
+                    'session_date': session_dir[:10],
+                })
+    return fixtures
+
+
+def fixture_name(fixture):
+    return f"{fixture['year']}/{fixture['race']}/{fixture['session_type']}"
+
+
+def make_session(fixture):
+    """Build the Session without the event schedule, which is not cached."""
+    from fastf1.core import Session
+    from fastf1.events import Event
+
+    import session_index
+
+    name = session_index.SESSION_NAMES[fixture['session_type']]
+    slot = SESSION_SLOTS[fixture['session_type']]
+    data = {
+        'RoundNumber': 0,
+        'Country': '',
+        'Location': '',
+        'OfficialEventName': fixture['race'],
+        'EventDate': pd.Timestamp(fixture['event_date']),
+        'EventName': fixture['race'],
+        'EventFormat': 'sprint_qualifying' if fixture['session_type'] == 'S' else 'conventional',
+        'F1ApiSupport': True,
+    }
+    session_date = pd.Timestamp(fixture['session_date']) + pd.Timedelta(hours=12)
+    for i in range(1, 6):
+        data[f'Session{i}'] = name if i == slot else 'None'
+        data[f'Session{i}Date'] = session_date.tz_localize('UTC') if i == slot else pd.NaT
+        data[f'Session{i}DateUtc'] = session_date if i == slot else pd.NaT
+    return Session(Event(data, year=fixture['year']), name, f1_api_support=True)
+
+
+def load_fixture(fixture):
+    session = make_session(fixture)
+    session.load(laps=True, telemetry=False, weather=True, messages=True)
+    return session
+
+
+def synthetic_telemetry(session, hz=SYNTHETIC_HZ):
+    """Attach deterministic car and position data covering every lap."""
+    from fastf1.core import Telemetry
+
+    rng = np.random.default_rng(0)
+    session._t0_date = pd.Timestamp(session.date).tz_localize(None)
+    session._car_data, session._pos_data = {}, {}
+
+    # like the live feed, every car is sampled on the same clock
+    start = session.laps['LapStartTime'].min() - pd.Timedelta(seconds=5)
+    end = session.laps['Time'].max() + pd.Timedelta(seconds=5)
+    n = int((end - start).total_seconds() * hz)
+    t = start + pd.to_timedelta(np.arange(n) / hz, unit='s')
+
+    for driver_number in session.drivers:
+        if not (session.laps['DriverNumber'] == driver_number).any():
+            continue
+        phase = np.arange(n) / (hz * 90.0) * 2 * np.pi * 6
+        speed = 200 + 100 * np.sin(phase) + rng.normal(0, 2, n)
+        car = pd.DataFrame({
+            'Date': session._t0_date + t, 'Time': t, 'SessionTime': t,
+            'RPM': speed * 40, 'Speed': speed,
+            'nGear': np.clip(speed // 45, 1, 8).astype(int),
+            'Throttle': np.where(np.sin(phase) > -0.3, 100.0, 0.0),
+            'Brake': np.sin(phase) < -0.5, 'DRS': 0, 'Source': 'car',
+        })
+        pos = pd.DataFrame({
+            'Date': session._t0_date + t, 'Time': t, 'SessionTime': t,
+            'X': 1000 * np.cos(phase), 'Y': 1000 * np.sin(phase), 'Z': 0.0,
+            'Status': 'OnTrack', 'Source': 'pos',
+        })
+        session._car_data[driver_number] = Telemetry(car, session=session, driver=driver_number)
+        session._pos_data[driver_number] = Telemetry(pos, session=session, driver=driver_number)
+    return session
+
+
+def measure(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {'min': min(runs), 'median': statistics.median(runs), 'runs': len(runs)}
+
+
+class _Recorder:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.timings = {}
+        self.errors = {}
+
+    def time(self, name, fn, repeat=None):
+        try:
+            self.timings[name] = measure(fn, repeat or self.repeat)
+        except Exception as e:
+            self.errors[name] = f"{type(e).__name__}: {e}"
+
+
+def bench_fixture(fixture, repeat):
+    import analysis
+    import charts
+    import compact
+    import degradation
+    import lap_index
+    import lap_overlay
+    import pace
+    import race_matrix
+    import session_store
+    import telemetry
+    from utils import plot_speed_trace
+
+    recorder = _Recorder(repeat)
+    year, race, session_type = fixture['year'], fixture['race'], fixture['session_type']
+
+    recorder.time('session_load', lambda: load_fixture(fixture))
+    session = load_fixture(fixture)
+    drivers = pd.unique(session.laps['Driver']).tolist()
+
+    telemetry_source = 'session'
+    if not session_store.session_parts(session) >= {'telemetry'}:
+        synthetic_telemetry(session)
+        telemetry_source = 'synthetic'
+
+    # everything below runs on the compact form, as in the app
+    sizes = {}
+    recorder.time('compact', lambda: sizes.update(compact.compact_session(session)), repeat=1)
+
+    recorder.time('pick_driver', lambda: [session.laps.pick_drivers(d) for d in drivers])
+    recorder.time('lap_index', lambda: lap_index.LapIndex(session.laps))
+    laps_by_driver = lap_index.for_session(session)
+    recorder.time('lap_index_driver', lambda: [laps_by_driver.driver(d) for d in drivers])
+
+    recorder.time('store_save', lambda: session_store.save_session(session, year, race, session_type))
+    recorder.time('store_load_laps', lambda: session_store.load_laps(year, race, session_type))
+    recorder.time('store_load_session',
+                  lambda: session_store.load_session(year, race, session_type))
+
+    telemetry_drivers = drivers[:TELEMETRY_DRIVERS]
+
+    def get_telemetry():
+        for driver in telemetry_drivers:
+            laps = laps_by_driver.driver(driver)
+            laps.iloc[len(laps) // 2].get_telemetry()
+
+    recorder.time('get_telemetry', get_telemetry)
+    recorder.time('extract_driver',
+                  lambda: telemetry.extract_driver(session.laps.pick_drivers(drivers[0])), repeat=1)
+
+    primary_driver = drivers[0]
+    secondary_drivers = drivers[1:3]
+    primary_laps = laps_by_driver.driver(primary_driver)
+
+    overlay_pairs = lap_overlay.fastest_laps(session, telemetry_drivers)
+
+    recorder.time('analysis.calculate_stint_statistics',
+                  lambda: analysis.calculate_stint_statistics(primary_laps))
+    recorder.time('analysis.analyze_sector_performance',
+                  lambda: analysis.analyze_sector_performance(primary_laps))
+    recorder.time('analysis.calculate_tire_degradation',
+                  lambda: analysis.calculate_tire_degradation(primary_laps))
+    recorder.time('degradation', lambda: degradation.DegradationModel(session.laps, session.total_laps))
+    recorder.time('pace', lambda: pace.PaceModel(laps_by_driver.laps))
+    recorder.time('race_matrix', lambda: race_matrix.LapMatrix(session.laps))
+    recorder.time('analysis.battle_analysis',
+                  lambda: analysis.battle_analysis(session, primary_driver, secondary_drivers[0]))
+    recorder.time('race_matrix.battle_summary',
+                  lambda: race_matrix.for_session(session).battle_summary())
+
+    figures = {
+        'position_progression': lambda: charts.position_progression(
+            laps_by_driver, primary_driver, secondary_drivers),
+        'lap_time_distribution': lambda: charts.lap_time_distribution(
+            laps_by_driver, primary_driver, secondary_drivers),
+        'sector_times': lambda: charts.sector_times(
+            laps_by_driver, primary_driver, secondary_drivers),
+        'speed_traps': lambda: charts.speed_traps(
+            laps_by_driver, primary_driver, secondary_drivers),
+        'speed_trace': lambda: plot_speed_trace(
+            primary_laps, int(primary_laps['LapNumber'].iloc[len(primary_laps) // 2])),
+        'telemetry_comparison': lambda: charts.telemetry_comparison(
+            lap_overlay.compare(session, overlay_pairs)),
+    }
+    if session_type == 'R':
+        figures['rolling_pace'] = lambda: charts.rolling_pace(
+            pace.for_session(session), primary_driver, secondary_drivers)
+        figures['gap_evolution'] = lambda: charts.gap_evolution(
+            race_matrix.for_session(session), primary_driver, secondary_drivers)
+
+    for name, build in figures.items():
+        recorder.time(f'figure.{name}', build)
+        fig = build()
+        if fig is None:
+            recorder.errors[f'figure.{name}'] = 'no figure returned'
+            continue
+        recorder.time(f'figure_json.{name}', fig.to_json)
+
+    # after the figures, so that speed_trace still includes the extraction
+    overlay_samples = [np.asarray(telemetry.driver_telemetry(session, driver).samples(lap_number))
+                       for driver, lap_number in overlay_pairs]
+    recorder.time('lap_overlay.resample', lambda: lap_overlay.resample(overlay_samples))
+
+    return {
+        'laps': len(session.laps),
+        'drivers': len(drivers),
+        'telemetry': telemetry_source,
+        'bytes': sizes,
+        'timings': recorder.timings,
+        'errors': recorder.errors,
+    }
+
+
+def run(fixtures=None, repeat=5, fixture_dir=FIXTURE_DIR):
+    import fastf1
+
+    import cache_manager
+    import session_store
+
+    import utils  # noqa: F401  enables the repository cache on import, replaced below
+
+    fastf1.set_log_level('ERROR')
+    fixtures = discover_fixtures(fixture_dir) if fixtures is None else fixtures
+    results = {
+        'meta': {
+            'python': sys.version.split()[0],
+            'fastf1': fastf1.__version__,
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'timestamp': time.time(),
+            'repeat': repeat,
+        },
+        'fixtures': {},
+    }
+
+    scratch = tempfile.mkdtemp(prefix='f1-bench-')
+    store_dir = session_store.STORE_DIR
+    try:
+        cache_dir = os.path.join(scratch, 'cache')
+        shutil.copytree(fixture_dir, cache_dir)
+        cache_manager.CacheManager(cache_dir).decompress_all()
+        session_store.STORE_DIR = os.path.join(scratch, 'store')
+        # the fixtures were written by whichever fastf1 version was current
+        # when they were checked in; they are frozen, so accept them as they are
+        fastf1.Cache.enable_cache(cache_dir, ignore_version=True)
+        fastf1.Cache.offline_mode(True)
+
+        for fixture in fixtures:
+            try:
+                results['fixtures'][fixture_name(fixture)] = bench_fixture(fixture, repeat)
+            except Exception as e:
+                results['fixtures'][fixture_name(fixture)] = {'error': f"{type(e).__name__}: {e}"}
+    finally:
+        fastf1.Cache.offline_mode(False)
+        session_store.STORE_DIR = store_dir
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def _medians(results):
+    medians = {}
+    for name, fixture in results['fixtures'].items():
+        for metric, timing in fixture.get('timings', {}).items():
+            medians[f"{name}::{metric}"] = timing['median']
+    return medians
+
+
+def compare(results, baseline, tolerance=TOLERANCE, min_delta=MIN_DELTA):
+    current, previous = _medians(results), _medians(baseline)
+    report = {'regressions': [], 'improvements': [], 'missing': [], 'new': []}
+    for key, before in previous.items():
+        after = current.get(key)
+        if after is None:
+            report['missing'].append(key)
+            continue
+        entry = {'benchmark': key, 'baseline': before, 'current': after,
+                 'ratio': after / before if before else None}
+        if after > before * (1 + tolerance) and after - before > min_delta:
+            report['regressions'].append(entry)
+        elif after < before / (1 + tolerance) and before - after > min_delta:
+            report['improvements'].append(entry)
+    report['new'] = sorted(set(current) - set(previous))
+    return report
+
+
+def _print_results(results):
+    for name, fixture in results['fixtures'].items():
+        if 'error' in fixture:
+            print(f"{name}: failed ({fixture['error']})")
+            continue
+        print(f"{name}: {fixture['laps']} laps, {fixture['drivers']} drivers, "
+              f"{fixture['telemetry']} telemetry")
+        if fixture.get('bytes'):
+            print(f"  {'bytes before/after compaction':<45} {fixture['bytes']['before']:>12} "
+                  f"{fixture['bytes']['after']:>12}")
+        for metric, timing in fixture['timings'].items():
+            print(f"  {metric:<45} {timing['median'] * 1000:10.2f} ms")
+        for metric, error in fixture['errors'].items():
+            print(f"  {metric:<45} error: {error}")
+
+
+def _print_report(report):
+    for label in ('regressions', 'improvements'):
+        for entry in report[label]:
+            print(f"{label[:-1]}: {entry['benchmark']} "
+                  f"{entry['baseline'] * 1000:.2f} ms -> {entry['current'] * 1000:.2f} ms")
+    for key in report['missing']:
+        print(f"missing: {key}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on the cached sessions.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help="fastf1 cache directory to read sessions from")
+    parser.add_argument('--output', default=None, help="write the results as JSON to this file")
+    parser.add_argument('--baseline', default=None, help="compare against the results in this JSON file")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="write the results to the --baseline file instead of comparing")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help="relative slowdown tolerated before a benchmark counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(repeat=args.repeat, fixture_dir=args.fixtures)
+    _print_results(results)
+
+    status = 0
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        results['comparison'] = compare(results, baseline, args.tolerance)
+        _print_report(results['comparison'])
+        status = 1 if results['comparison']['regressions'] else 0
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return status
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,381 @@
+import argparse
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+
+import session_index
+import session_store
+
+# Housekeeping of the fastf1 cache directory. Every session directory
+# (<year>/<event>/<session>) is one unit together with its session_store
+# directory: its last access is recorded when it is loaded, sessions that have
+# not been used for a while are compressed in place, and the least recently
+# used ones are deleted once the session directories are over their disk
+# budget. Store directories without a cache session are units of their own.
+# Other files (the HTTP cache, the index files, shared/, the season cube) are
+# reported but never evicted, so they do not count against the budget. Compressed sessions are restored before fastf1 reads
+# them, so callers never see the compressed form.
+CACHE_DIR = session_index.CACHE_DIR
+MAX_BYTES = int(os.environ.get('F1_CACHE_MAX_BYTES', 1024 ** 3))
+COLD_AFTER = float(os.environ.get('F1_CACHE_COLD_DAYS', '3')) * 24 * 60 * 60
+MAINTAIN_INTERVAL = 10 * 60
+
+ACCESS_FILE = 'cache_access.json'
+CACHE_SUFFIX = '.ff1pkl'
+COMPRESSED_SUFFIX = '.gz'
+OTHER = 'other'
+
+
+def logical_name(file_name):
+    if file_name.endswith(CACHE_SUFFIX + COMPRESSED_SUFFIX):
+        return file_name[:-len(COMPRESSED_SUFFIX)]
+    return file_name
+
+
+def _file_type(file_name):
+    name = logical_name(file_name)
+    if name.endswith(CACHE_SUFFIX):
+        return name[:-len(CACHE_SUFFIX)]
+    return os.path.splitext(name)[1].lstrip('.') or name
+
+
+class CacheManager:
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_BYTES, cold_after=COLD_AFTER):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.cold_after = cold_after
+        self.access_path = os.path.join(root, ACCESS_FILE)
+        self._access = None
+        self._last_maintained = 0
+        self._maintaining = False
+        self._lock = threading.RLock()
+
+    # access log
+
+    def _load_access(self):
+        if self._access is None:
+            try:
+                with open(self.access_path) as f:
+                    self._access = json.load(f)
+            except (OSError, ValueError):
+                self._access = {}
+        return self._access
+
+    def _save_access(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.access_path + '.tmp', 'w') as f:
+            json.dump(self._access, f, indent=1, sort_keys=True)
+        os.replace(self.access_path + '.tmp', self.access_path)
+
+    def session_path(self, year, race, session_type):
+        name = session_index.SESSION_NAMES.get(session_type, session_type)
+        year_dir = os.path.join(self.root, str(year))
+        if not os.path.isdir(year_dir):
+            return None
+        for event_dir in os.listdir(year_dir):
+            if session_index._strip_date(event_dir) != race:
+                continue
+            event_path = os.path.join(year_dir, event_dir)
+            for session_dir in os.listdir(event_path):
+                if session_index._strip_date(session_dir) == name:
+                    return os.path.join(event_path, session_dir)
+        return None
+
+    @staticmethod
+    def _in_store(path):
+        return os.path.abspath(path).startswith(os.path.abspath(session_store.STORE_DIR) + os.sep)
+
+    def _key(self, path):
+        if self._in_store(path):
+            return 'store/' + os.path.relpath(path, session_store.STORE_DIR).replace(os.sep, '/')
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def store_path(self, path):
+        """session_store directory of the cache session at ``path``."""
+        year, event_dir, session_dir = self._key(path).split('/')
+        name = session_index._strip_date(session_dir)
+        return session_store.session_dir(year, session_index._strip_date(event_dir),
+                                         session_index.SESSION_TYPES.get(name, name))
+
+    def _paths(self, path):
+        if self._in_store(path):
+            return [path]
+        store = self.store_path(path)
+        return [path, store] if os.path.isdir(store) else [path]
+
+    def touch(self, path, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            access = self._load_access()
+            entry = access.setdefault(self._key(path), {'last': now, 'count': 0})
+            entry['last'] = now
+            entry['count'] += 1
+            self._save_access()
+
+    def last_access(self, path):
+        entry = self._load_access().get(self._key(path))
+        if entry is not None:
+            return entry['last']
+        # never loaded through the app: fall back to when it was written
+        return max((os.path.getmtime(os.path.join(path, f)) for f in os.listdir(path)), default=0)
+
+    # session directories
+
+    @staticmethod
+    def _session_dirs(root):
+        if not os.path.isdir(root):
+            return
+        for year in sorted(os.listdir(root)):
+            year_dir = os.path.join(root, year)
+            if not (year.isdigit() and os.path.isdir(year_dir)):
+                continue
+            for event_dir in sorted(os.listdir(year_dir)):
+                event_path = os.path.join(year_dir, event_dir)
+                if not os.path.isdir(event_path):
+                    continue
+                for session_dir in sorted(os.listdir(event_path)):
+                    path = os.path.join(event_path, session_dir)
+                    if os.path.isdir(path):
+                        yield path
+
+    def sessions(self):
+        return self._session_dirs(self.root)
+
+    def store_sessions(self):
+        """session_store directories that have no cache session."""
+        linked = {os.path.abspath(self.store_path(path)) for path in self.sessions()}
+        for path in self._session_dirs(session_store.STORE_DIR):
+            if os.path.abspath(path) not in linked:
+                yield path
+
+    @staticmethod
+    def _dir_bytes(path):
+        return sum(os.path.getsize(os.path.join(dirpath, f))
+                   for dirpath, _, file_names in os.walk(path) for f in file_names)
+
+    def session_bytes(self, path):
+        """Size of a session: its cache directory and its store directory."""
+        return sum(self._dir_bytes(p) for p in self._paths(path))
+
+    def is_compressed(self, path):
+        return any(f.endswith(COMPRESSED_SUFFIX) for f in os.listdir(path))
+
+    def in_use(self, path, now=None):
+        now = time.time() if now is None else now
+        return now - self.last_access(path) < MAINTAIN_INTERVAL
+
+    def compress(self, path):
+        saved = 0
+        for file_name in os.listdir(path):
+            if not file_name.endswith(CACHE_SUFFIX):
+                continue
+            # one file at a time, so loads of other sessions are not held up;
+            # stop if this one has been opened in the meantime
+            with self._lock:
+                if self.in_use(path):
+                    break
+                source = os.path.join(path, file_name)
+                target = source + COMPRESSED_SUFFIX
+                with open(source, 'rb') as src, gzip.open(target + '.tmp', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(target + '.tmp', target)
+                shutil.copystat(source, target)
+                saved += os.path.getsize(source) - os.path.getsize(target)
+                os.remove(source)
+        return saved
+
+    def decompress(self, path):
+        with self._lock:
+            for file_name in os.listdir(path):
+                if not file_name.endswith(CACHE_SUFFIX + COMPRESSED_SUFFIX):
+                    continue
+                source = os.path.join(path, file_name)
+                target = os.path.join(path, logical_name(file_name))
+                with gzip.open(source, 'rb') as src, open(target + '.tmp', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(target + '.tmp', target)
+                shutil.copystat(source, target)
+                os.remove(source)
+
+    def decompress_all(self):
+        for path in list(self.sessions()):
+            self.decompress(path)
+
+    def prepare(self, year, race, session_type):
+        """Restore and record the use of a session before fastf1 reads it."""
+        with self._lock:
+            path = self.session_path(year, race, session_type)
+            if path is None:
+                return None
+            self.decompress(path)
+            self.touch(path)
+            return path
+
+    def record(self, year, race, session_type):
+        """Record the use of a session that fastf1 has just written, or that was
+        read from the session store."""
+        path = self.session_path(year, race, session_type)
+        if path is None:
+            path = session_store.session_dir(year, race, session_type)
+            if not os.path.isdir(path):
+                return None
+        self.touch(path)
+        return path
+
+    def _remove(self, path):
+        self._load_access().pop(self._key(path), None)
+        for session_path in self._paths(path):
+            shutil.rmtree(session_path, ignore_errors=True)
+            # drop the event and year directories once they are empty
+            for parent in (os.path.dirname(session_path), os.path.dirname(os.path.dirname(session_path))):
+                try:
+                    os.rmdir(parent)
+                except OSError:
+                    break
+
+    # policies
+
+    def compress_cold(self, now=None):
+        now = time.time() if now is None else now
+        compressed, saved = [], 0
+        for path in list(self.sessions()):
+            if now - self.last_access(path) < self.cold_after or self.is_compressed(path):
+                continue
+            saved += self.compress(path)
+            if self.is_compressed(path):
+                compressed.append(self._key(path))
+        return {'compressed': compressed, 'saved_bytes': saved}
+
+    def evict(self, max_bytes=None, now=None):
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        now = time.time() if now is None else now
+        evicted, freed = [], 0
+        with self._lock:
+            by_age = sorted(list(self.sessions()) + list(self.store_sessions()), key=self.last_access)
+            sizes = {path: self.session_bytes(path) for path in by_age}
+            total = sum(sizes.values())
+            for path in by_age:
+                # sessions in use right now are kept even over budget
+                if total <= max_bytes or self.in_use(path, now):
+                    break
+                nbytes = sizes[path]
+                self._remove(path)
+                total -= nbytes
+                freed += nbytes
+                evicted.append(self._key(path))
+            if evicted:
+                self._save_access()
+        return {'evicted': evicted, 'freed_bytes': freed}
+
+    def maintain(self, force=False):
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_maintained < MAINTAIN_INTERVAL:
+                return None
+            self._last_maintained = now
+        result = self.compress_cold(now)
+        result.update(self.evict(now=now))
+        return result
+
+    def maintain_in_background(self):
+        with self._lock:
+            if self._maintaining or time.time() - self._last_maintained < MAINTAIN_INTERVAL:
+                return
+            self._maintaining = True
+
+        def run():
+            try:
+                self.maintain()
+            finally:
+                self._maintaining = False
+
+        threading.Thread(target=run, name='f1-cache-maintenance', daemon=True).start()
+
+    # reporting
+
+    def usage(self):
+        report = {'root': self.root, 'store': session_store.STORE_DIR, 'total_bytes': 0, 'session_bytes': 0,
+                  'compressed_bytes': 0, 'max_bytes': self.max_bytes, 'seasons': {}, 'file_types': {},
+                  'sessions': []}
+
+        def add(season, file_name, nbytes):
+            report['total_bytes'] += nbytes
+            report['seasons'][season] = report['seasons'].get(season, 0) + nbytes
+            file_type = _file_type(file_name)
+            report['file_types'][file_type] = report['file_types'].get(file_type, 0) + nbytes
+            if file_name.endswith(COMPRESSED_SUFFIX):
+                report['compressed_bytes'] += nbytes
+
+        for root in (self.root, session_store.STORE_DIR):
+            for dirpath, _, file_names in os.walk(root):
+                relative = os.path.relpath(dirpath, root).split(os.sep)
+                season = relative[0] if relative[0].isdigit() else OTHER
+                for file_name in file_names:
+                    add(season, file_name, os.path.getsize(os.path.join(dirpath, file_name)))
+
+        access = self._load_access()
+        for path in list(self.sessions()) + list(self.store_sessions()):
+            entry = access.get(self._key(path), {})
+            report['sessions'].append({
+                'session': self._key(path),
+                'bytes': self.session_bytes(path),
+                'compressed': self.is_compressed(path),
+                'last_access': self.last_access(path),
+                'accesses': entry.get('count', 0),
+            })
+        report['session_bytes'] = sum(session['bytes'] for session in report['sessions'])
+        return report
+
+
+manager = CacheManager()
+
+
+def _format_bytes(nbytes):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(nbytes) < 1024 or unit == 'GiB':
+            return f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report on and tidy up the fastf1 cache directory.")
+    parser.add_argument('command', choices=['report', 'maintain', 'compress', 'decompress', 'evict'])
+    parser.add_argument('--cache', default=CACHE_DIR)
+    parser.add_argument('--max-bytes', type=int, default=MAX_BYTES)
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    args = parser.parse_args(argv)
+
+    cache = CacheManager(args.cache, max_bytes=args.max_bytes)
+    if args.command == 'report':
+        result = cache.usage()
+    elif args.command == 'maintain':
+        result = cache.maintain(force=True)
+    elif args.command == 'compress':
+        result = cache.compress_cold(now=float('inf'))
+    elif args.command == 'decompress':
+        cache.decompress_all()
+        result = cache.usage()
+    else:
+        result = cache.evict()
+
+    if args.json or args.command != 'report':
+        print(json.dumps(result, indent=2))
+        return 0
+
+    print(f"{result['root']} and {result['store']}: {_format_bytes(result['total_bytes'])}, sessions "
+          f"{_format_bytes(result['session_bytes'])} of {_format_bytes(result['max_bytes'])} "
+          f"({_format_bytes(result['compressed_bytes'])} compressed)")
+    print("By season:")
+    for season, nbytes in sorted(result['seasons'].items()):
+        print(f"  {season:<10} {_format_bytes(nbytes):>12}")
+    print("By file type:")
+    for file_type, nbytes in sorted(result['file_types'].items(), key=lambda item: -item[1]):
+        print(f"  {file_type:<30} {_format_bytes(nbytes):>12}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
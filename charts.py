@@ -0,0 +1,269 @@
+import lap_index
+import telemetry
+
+# Figures of the app.py sections. They only take a LapIndex and the selected
+# drivers, so they can be built (and timed) outside of a Streamlit run.
+SECTORS = ['Sector1Time', 'Sector2Time', 'Sector3Time']
+SPEED_METRICS = ['SpeedI1', 'SpeedI2', 'SpeedFL']
+
+
+def position_progression(laps_by_driver, primary_driver, secondary_drivers):
+    import plotly.graph_objects as go
+
+    position_fig = go.Figure()
+    primary_laps = laps_by_driver.driver(primary_driver)
+    position_fig.add_trace(go.Scatter(
+        x=primary_laps['LapNumber'],
+        y=primary_laps['Position'],
+        name=primary_driver,
+        line=dict(color='red', width=3)
+    ))
+
+    for driver in secondary_drivers:
+        driver_laps = laps_by_driver.driver(driver)
+        position_fig.add_trace(go.Scatter(
+            x=driver_laps['LapNumber'],
+            y=driver_laps['Position'],
+            name=driver,
+            line=dict(width=2)
+        ))
+
+    position_fig.update_layout(
+        yaxis_autorange="reversed",
+        yaxis_title="Position",
+        xaxis_title="Lap Number"
+    )
+    return position_fig
+
+
+def lap_time_distribution(laps_by_driver, primary_driver, secondary_drivers):
+    import plotly.graph_objects as go
+
+    laptimes_fig = go.Figure()
+    primary_laps = laps_by_driver.driver(primary_driver)['LapTimeSeconds']
+
+    laptimes_fig.add_trace(go.Histogram(
+        x=primary_laps,
+        name=primary_driver,
+        nbinsx=30,
+        opacity=0.7
+    ))
+
+    for driver in secondary_drivers:
+        driver_laps = laps_by_driver.driver(driver)['LapTimeSeconds']
+        laptimes_fig.add_trace(go.Histogram(
+            x=driver_laps,
+            name=driver,
+            nbinsx=30,
+            opacity=0.5
+        ))
+
+    laptimes_fig.update_layout(
+        barmode='overlay',
+        xaxis_title="Lap Time (seconds)",
+        yaxis_title="Count"
+    )
+    return laptimes_fig
+
+
+def sector_times(laps_by_driver, primary_driver, secondary_drivers):
+    import plotly.graph_objects as go
+
+    sector_fig = go.Figure()
+    for driver in [primary_driver] + list(secondary_drivers):
+        driver_sectors = laps_by_driver.driver(driver)
+        for sector in SECTORS:
+            sector_fig.add_trace(go.Box(
+                y=driver_sectors[lap_index.seconds_column(sector)],
+                name=f"{driver} {sector[:-4]}",
+                boxpoints='outliers'
+            ))
+    return sector_fig
+
+
+def speed_traps(laps_by_driver, primary_driver, secondary_drivers):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    speed_fig = make_subplots(rows=3, cols=1,
+                              subplot_titles=('Speed Trap 1', 'Speed Trap 2', 'Finish Line'))
+
+    for idx, metric in enumerate(SPEED_METRICS, 1):
+        for driver in [primary_driver] + list(secondary_drivers):
+            driver_laps = laps_by_driver.driver(driver)
+            speed_fig.add_trace(
+                go.Box(y=driver_laps[metric], name=driver,
+                       boxpoints='outliers'), row=idx, col=1
+            )
+
+    speed_fig.update_layout(height=800, showlegend=False)
+    return speed_fig
+
+
+def rolling_pace(pace_model, primary_driver, secondary_drivers, metric='RollingMean'):
+    import plotly.graph_objects as go
+
+    pace_fig = go.Figure()
+    primary_laps = pace_model.driver(primary_driver)
+    pace_fig.add_trace(go.Scatter(
+        x=primary_laps['LapNumber'],
+        y=primary_laps[metric],
+        name=primary_driver,
+        line=dict(color='red', width=3)
+    ))
+
+    for driver in secondary_drivers:
+        driver_laps = pace_model.driver(driver)
+        pace_fig.add_trace(go.Scatter(
+            x=driver_laps['LapNumber'],
+            y=driver_laps[metric],
+            name=driver
+        ))
+    return pace_fig
+
+
+def gap_evolution(lap_matrix, primary_driver, secondary_drivers):
+    import plotly.graph_objects as go
+
+    gap_fig = go.Figure()
+    gaps = lap_matrix.gaps('gap_to_leader', [primary_driver] + list(secondary_drivers))
+    for driver in gaps.columns:
+        line = dict(color='red', width=3) if driver == primary_driver else None
+        gap_fig.add_trace(go.Scatter(
+            x=gaps.index,
+            y=gaps[driver],
+            name=driver,
+            line=line
+        ))
+    gap_fig.update_layout(yaxis_title="Gap to Leader (s)", yaxis_autorange="reversed")
+    return gap_fig
+
+
+def driver_lap_times(driver_laps, driver):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(data=[go.Histogram(x=driver_laps['LapTimeSeconds'], nbinsx=30)])
+    fig.update_layout(title=f"Lap Time Distribution for {driver}")
+    return fig
+
+
+def driver_speeds(driver_laps):
+    import plotly.graph_objects as go
+
+    speed_fig = go.Figure()
+    speed_fig.add_trace(go.Box(y=driver_laps['SpeedI1'], name='Speed Sector 1'))
+    speed_fig.add_trace(go.Box(y=driver_laps['SpeedI2'], name='Speed Sector 2'))
+    speed_fig.add_trace(go.Box(y=driver_laps['SpeedFL'], name='Speed Final'))
+    return speed_fig
+
+
+def driver_positions(driver_laps):
+    import plotly.graph_objects as go
+
+    pos_fig = go.Figure()
+    pos_fig.add_trace(go.Scatter(x=driver_laps['LapNumber'],
+                                 y=driver_laps['Position'],
+                                 mode='lines+markers'))
+    pos_fig.update_layout(yaxis_autorange="reversed")
+    return pos_fig
+
+
+def speed_trace(laps_data, lap_number):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    lap_telemetry = telemetry.lap_telemetry(laps_data, lap_number)
+    traces = telemetry.decimate(lap_telemetry, ['Speed', 'Throttle', 'Brake'])
+
+    fig = make_subplots(rows=2, cols=1, subplot_titles=('Speed Trace', 'Throttle/Brake'))
+
+    fig.add_trace(go.Scatter(x=traces['Speed'][0], y=traces['Speed'][1],
+                             name='Speed', line=dict(color='blue')), row=1, col=1)
+
+    fig.add_trace(go.Scatter(x=traces['Throttle'][0], y=traces['Throttle'][1],
+                             name='Throttle', line=dict(color='green')), row=2, col=1)
+    fig.add_trace(go.Scatter(x=traces['Brake'][0], y=traces['Brake'][1] * 100,
+                             name='Brake', line=dict(color='red')), row=2, col=1)
+
+    fig.update_layout(height=800)
+    return fig
+
+
+def tyre_degradation(degradation_model, driver):
+    import plotly.graph_objects as go
+
+    deg_fig = go.Figure()
+    deg_laps = degradation_model.driver_laps(driver)
+    for compound, compound_laps in deg_laps.groupby('Compound', sort=False, observed=True):
+        deg_fig.add_trace(go.Scatter(x=compound_laps['TyreLife'], y=compound_laps['FuelCorrected'],
+                                     mode='markers', name=str(compound)))
+    for curve in degradation_model.curves(driver):
+        deg_fig.add_trace(go.Scatter(x=curve['TyreLife'], y=curve['FuelCorrected'], mode='lines',
+                                     name=f"Stint {curve['Stint']} fit ({curve['Compound']})"))
+    y_title = "Fuel Corrected Lap Time (s)" if degradation_model.fuel_seconds_per_lap else "Lap Time (s)"
+    deg_fig.update_layout(xaxis_title="Tyre Life (laps)", yaxis_title=y_title)
+    return deg_fig
+
+
+def battle(battle_data, column, yaxis_title=None):
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=battle_data['LapNumber'],
+                             y=battle_data[column],
+                             mode='lines+markers'))
+    if yaxis_title is not None:
+        fig.update_layout(yaxis_title=yaxis_title)
+    return fig
+
+
+def pace_evolution(pace_model, drivers, metric):
+    import plotly.graph_objects as go
+
+    pace_fig = go.Figure()
+    for driver in drivers:
+        driver_pace = pace_model.driver(driver)
+        pace_fig.add_trace(go.Scatter(x=driver_pace['LapNumber'],
+                                      y=driver_pace[metric],
+                                      name=driver))
+    return pace_fig
+
+
+def gap_to_leader(lap_matrix, drivers):
+    import plotly.graph_objects as go
+
+    gaps = lap_matrix.gaps('gap_to_leader', drivers)
+    leader_fig = go.Figure()
+    for driver in gaps.columns:
+        leader_fig.add_trace(go.Scatter(x=gaps.index, y=gaps[driver], name=driver))
+    leader_fig.update_layout(yaxis_title="Gap to Leader (s)", yaxis_autorange="reversed")
+    return leader_fig
+
+
+def fuel_effect(pace_model, drivers):
+    import plotly.express as px
+
+    return px.line(pace_model.wide('LapTimeSeconds', drivers))
+
+
+def telemetry_comparison(comparison):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    reference = comparison.labels[comparison.reference]
+    fig = make_subplots(rows=3, cols=1, shared_xaxes=True, row_heights=[0.5, 0.25, 0.25],
+                        subplot_titles=('Speed', 'Throttle', f'Delta to {reference}'))
+    for i, label in enumerate(comparison.labels):
+        line = dict(color='red', width=3) if i == 0 else dict()
+        for row, values in ((1, comparison.channels['Speed'][i]), (2, comparison.channels['Throttle'][i]),
+                            (3, comparison.delta[i])):
+            fig.add_trace(go.Scatter(x=comparison.distance, y=values, name=label, legendgroup=label,
+                                     showlegend=row == 1, line=line), row=row, col=1)
+    fig.update_layout(
+        height=800,
+        xaxis3_title="Distance (m)",
+        yaxis_title="Speed (km/h)",
+        yaxis2_title="Throttle (%)",
+        yaxis3_title="Delta (s)"
+    )
+    return fig
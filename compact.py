@@ -0,0 +1,127 @@
+import argparse
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+
+import session_cache
+
+_logger = logging.getLogger(__name__)
+
+# Loaded sessions are converted in place to a compact form before they are
+# cached: repeated strings become categoricals and measured values become
+# float32 (or int16 for discrete telemetry channels). fastf1's own time
+# columns (Time, LapStartTime, SessionTime, Date, ...) are kept as they are,
+# since fastf1 slices telemetry by them; the seconds the charts read are kept
+# as float32 by lap_index.
+LAP_FLOAT_COLUMNS = ['LapNumber', 'Stint', 'TyreLife', 'Position',
+                     'SpeedI1', 'SpeedI2', 'SpeedFL', 'SpeedST']
+TELEMETRY_FLOAT_CHANNELS = ['Speed', 'RPM', 'Throttle', 'X', 'Y', 'Z']
+TELEMETRY_INT_CHANNELS = ['nGear', 'DRS']
+WEATHER_FLOAT_COLUMNS = ['AirTemp', 'Humidity', 'Pressure', 'TrackTemp', 'WindSpeed']
+
+# fastf1 fills the Source of interpolated samples with this value, so it has
+# to be a category before any merge.
+EXTRA_CATEGORIES = {'Source': ['interpolation']}
+
+# (year, race, session_type) -> bytes before and after the last compaction
+reports = {}
+
+
+def _is_strings(series):
+    return series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == 'string'
+
+
+def _floats(df, columns):
+    for column in columns:
+        if column in df.columns and df[column].dtype == np.float64:
+            df[column] = df[column].astype('float32')
+
+
+def _ints(df, columns):
+    for column in columns:
+        if column in df.columns and df[column].dtype.kind in 'iu' and df[column].dtype.itemsize > 2:
+            df[column] = df[column].astype('int16')
+
+
+def _category_dtypes(frames):
+    """One categorical dtype per string column, shared by all ``frames``."""
+    values = {}
+    for df in frames:
+        for column in df.columns:
+            if _is_strings(df[column]) or isinstance(df[column].dtype, pd.CategoricalDtype):
+                values.setdefault(column, set()).update(df[column].dropna().unique())
+    return {column: pd.CategoricalDtype(sorted(found | set(EXTRA_CATEGORIES.get(column, []))))
+            for column, found in values.items()}
+
+
+def _categories(df, dtypes):
+    for column, dtype in dtypes.items():
+        if column in df.columns and df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+
+
+def compact_laps(laps):
+    _floats(laps, LAP_FLOAT_COLUMNS)
+    _categories(laps, _category_dtypes([laps]))
+
+
+def compact_telemetry(frames):
+    """Compact per-driver telemetry frames (car and position data together).
+
+    String columns get one categorical dtype over all frames, as fastf1
+    merges car and position data column by column.
+    """
+    dtypes = _category_dtypes(frames)
+    for df in frames:
+        _floats(df, TELEMETRY_FLOAT_CHANNELS)
+        _ints(df, TELEMETRY_INT_CHANNELS)
+        _categories(df, dtypes)
+
+
+def compact_session(session):
+    """Compact everything loaded into ``session``; returns bytes before and after."""
+    before = session_cache.session_nbytes(session)
+    laps = getattr(session, '_laps', None)
+    if laps is not None:
+        compact_laps(laps)
+    compact_telemetry([df for attr in session_cache.TELEMETRY_ATTRS
+                       for df in (getattr(session, attr, None) or {}).values()])
+    weather = getattr(session, '_weather_data', None)
+    if weather is not None:
+        _floats(weather, WEATHER_FLOAT_COLUMNS)
+    return {'before': before, 'after': session_cache.session_nbytes(session)}
+
+
+def compact(session, year, race, session_type):
+    """Compact ``session`` and record how much it saved."""
+    try:
+        report = compact_session(session)
+    except Exception as e:
+        _logger.warning(f"Could not compact {year} {race} {session_type}: {e}")
+        return None
+    reports[(year, race, session_type)] = report
+    _logger.info(f"Compacted {year} {race} {session_type}: {report['before']} -> {report['after']} bytes")
+    return report
+
+
+def main(argv=None):
+    import session_loader
+
+    parser = argparse.ArgumentParser(description="Report the in-memory size of a session before and after "
+                                                 "compaction.")
+    parser.add_argument('year', type=int)
+    parser.add_argument('race')
+    parser.add_argument('session_type')
+    parser.add_argument('--telemetry', action='store_true')
+    args = parser.parse_args(argv)
+
+    views = ('basic', 'telemetry') if args.telemetry else ('basic',)
+    session = session_loader.load(args.year, args.race, args.session_type, session_loader.requirements(*views))
+    print(json.dumps(compact_session(session), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
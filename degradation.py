@@ -0,0 +1,150 @@
+import os
+import weakref
+
+import numpy as np
+import pandas as pd
+
+import lap_index
+
+_models = weakref.WeakKeyDictionary()
+
+# Lap time gained per lap as fuel burns off (about 1.7 kg/lap at 0.035 s/kg).
+# Race laps are corrected to the lap time they would have had on an empty
+# tank, so that the remaining trend within a stint is tyre wear.
+FUEL_SECONDS_PER_LAP = float(os.environ.get('F1_FUEL_SECONDS_PER_LAP', '0.06'))
+
+# Laps slower than this factor of their stint median (traffic, mistakes,
+# yellow flags not in TrackStatus) are left out of the fit.
+OUTLIER_FACTOR = 1.07
+MIN_STINT_LAPS = 3
+
+
+def _group_sums(codes, n_groups, *values):
+    return [np.bincount(codes, weights=v, minlength=n_groups) for v in values]
+
+
+def _fit(codes, n_groups, x, y):
+    """Least-squares line per group, all groups at once.
+
+    Returns (intercept, slope, n, r2) arrays indexed by group code; groups
+    with fewer than two distinct x values get NaN.
+    """
+    n, sx, sy, sxx, sxy, syy = _group_sums(codes, n_groups, np.ones_like(x), x, y, x * x, x * y, y * y)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sxx_c = sxx - sx * sx / n
+        sxy_c = sxy - sx * sy / n
+        syy_c = syy - sy * sy / n
+        slope = np.where(sxx_c > 0, sxy_c / sxx_c, np.nan)
+        intercept = (sy - slope * sx) / n
+        r2 = np.where(syy_c > 0, slope * sxy_c / syy_c, np.nan)
+    return intercept, slope, n, r2
+
+
+class DegradationModel:
+    """Fuel-corrected tyre degradation of every driver of a session.
+
+    ``stints`` has one row per (Driver, Stint) with the intercept and the
+    degradation rate in seconds per lap of tyre life. ``compounds`` has one
+    rate per compound, fitted over all stints on that compound with an own
+    intercept per stint. Both are solved in a single vectorised pass over
+    the whole field.
+    """
+
+    def __init__(self, laps, total_laps=None, fuel_correction=True,
+                 fuel_seconds_per_lap=FUEL_SECONDS_PER_LAP):
+        laps = laps[laps['LapTime'].notna() & laps['Stint'].notna() & laps['TyreLife'].notna()
+                    & laps['PitInTime'].isna() & laps['PitOutTime'].isna() & (laps['LapNumber'] > 1)]
+        if 'TrackStatus' in laps.columns:
+            laps = laps[laps['TrackStatus'].astype(str) == '1']
+
+        frame = pd.DataFrame({
+            'Driver': laps['Driver'].to_numpy(),
+            'Stint': laps['Stint'].to_numpy(dtype='int64'),
+            'Compound': laps['Compound'].to_numpy(),
+            'LapNumber': laps['LapNumber'].to_numpy(dtype='float64'),
+            'TyreLife': laps['TyreLife'].to_numpy(dtype='float64'),
+            'LapTimeSeconds': laps['LapTime'].dt.total_seconds().to_numpy(),
+        })
+        if total_laps is None:
+            total_laps = frame['LapNumber'].max() if len(frame) else 0
+        self.total_laps = total_laps
+        self.fuel_seconds_per_lap = fuel_seconds_per_lap if fuel_correction else 0.0
+        frame['FuelCorrected'] = frame['LapTimeSeconds'] - \
+            self.fuel_seconds_per_lap * (total_laps - frame['LapNumber'])
+
+        stint_key = pd.MultiIndex.from_arrays([frame['Driver'], frame['Stint']])
+        codes, uniques = pd.factorize(stint_key)
+        median = np.full(len(uniques), np.nan)
+        if len(frame):
+            median = frame.groupby(codes)['FuelCorrected'].median().reindex(range(len(uniques))).to_numpy()
+        frame = frame[frame['FuelCorrected'].to_numpy() <= OUTLIER_FACTOR * median[codes]]
+        self.laps = frame.reset_index(drop=True)
+
+        self.stints = self._fit_stints(self.laps)
+        self.compounds = self._fit_compounds(self.laps)
+
+    @staticmethod
+    def _fit_stints(frame):
+        codes, uniques = pd.factorize(pd.MultiIndex.from_arrays([frame['Driver'], frame['Stint']]))
+        intercept, slope, n, r2 = _fit(codes, len(uniques), frame['TyreLife'].to_numpy(),
+                                       frame['FuelCorrected'].to_numpy())
+        first = frame.groupby(codes).agg(Compound=('Compound', 'first'), TyreLifeStart=('TyreLife', 'min'),
+                                         TyreLifeEnd=('TyreLife', 'max'))
+        stints = pd.DataFrame({
+            'Driver': uniques.get_level_values(0),
+            'Stint': uniques.get_level_values(1),
+            'Compound': first['Compound'].to_numpy(),
+            'Laps': n.astype('int64'),
+            'TyreLifeStart': first['TyreLifeStart'].to_numpy(),
+            'TyreLifeEnd': first['TyreLifeEnd'].to_numpy(),
+            'Intercept': intercept,
+            'Rate': slope,
+            'R2': r2,
+        })
+        stints.loc[stints['Laps'] < MIN_STINT_LAPS, ['Intercept', 'Rate', 'R2']] = np.nan
+        return stints.sort_values(['Driver', 'Stint']).reset_index(drop=True)
+
+    @staticmethod
+    def _fit_compounds(frame):
+        # demean per stint (own intercept per stint), then one slope per compound
+        stint_codes, stint_uniques = pd.factorize(pd.MultiIndex.from_arrays([frame['Driver'], frame['Stint']]))
+        n, sx, sy = _group_sums(stint_codes, len(stint_uniques), np.ones(len(frame)),
+                                frame['TyreLife'].to_numpy(), frame['FuelCorrected'].to_numpy())
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x = frame['TyreLife'].to_numpy() - (sx / n)[stint_codes]
+            y = frame['FuelCorrected'].to_numpy() - (sy / n)[stint_codes]
+
+        compound_codes, compounds = pd.factorize(frame['Compound'])
+        sxx, sxy = _group_sums(compound_codes, len(compounds), x * x, x * y)
+        laps = np.bincount(compound_codes, minlength=len(compounds))
+        stints = pd.Series(stint_codes).groupby(compound_codes).nunique().reindex(range(len(compounds)))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rate = np.where(sxx > 0, sxy / sxx, np.nan)
+        return pd.DataFrame({
+            'Compound': np.asarray(compounds, dtype=object),
+            'Rate': rate,
+            'Stints': stints.to_numpy(),
+            'Laps': laps,
+        }).sort_values('Compound').reset_index(drop=True)
+
+    def driver_laps(self, driver):
+        return self.laps[self.laps['Driver'] == driver]
+
+    def curves(self, driver):
+        """Fitted line of each stint of ``driver`` over its tyre life range."""
+        stints = self.stints[(self.stints['Driver'] == driver) & self.stints['Rate'].notna()]
+        x = np.column_stack([stints['TyreLifeStart'], stints['TyreLifeEnd']])
+        y = stints['Intercept'].to_numpy()[:, None] + stints['Rate'].to_numpy()[:, None] * x
+        return [{'Stint': int(stint), 'Compound': compound, 'TyreLife': x[i], 'FuelCorrected': y[i]}
+                for i, (stint, compound) in enumerate(zip(stints['Stint'], stints['Compound']))]
+
+
+def for_session(session):
+    model = _models.get(session)
+    if model is None:
+        laps = lap_index.for_session(session).laps
+        is_race = session.name in ('Race', 'Sprint')
+        total_laps = getattr(session, 'total_laps', None) if is_race else None
+        model = DegradationModel(laps, total_laps=total_laps, fuel_correction=is_race)
+        _models[session] = model
+    return model
@@ -1,12 +1,10 @@
 import streamlit as st
 import fastf1
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from datetime import datetime
-import time
+
+import session_index
+import startup
+from utils import plot_speed_trace, get_latest_session, load_session_data
 
 fastf1.Cache.enable_cache('cache')
 
@@ -18,36 +16,7 @@ st.set_page_config(
 
 st.title("🏎️ Aman's Formula 1 Analyser - Analytics Project")
 
-
-def get_latest_session(year, race):
-    session_order = ['R', 'Q', 'S', 'FP3', 'FP2', 'FP1']
-    session_names = {
-        'R': 'Race',
-        'Q': 'Qualifying',
-        'S': 'Sprint',
-        'FP3': 'Practice 3',
-        'FP2': 'Practice 2',
-        'FP1': 'Practice 1'
-    }
-
-    for session_type in session_order:
-        try:
-            session = fastf1.get_session(year, race, session_type)
-            session.load()
-            return session, session_names[session_type]
-        except:
-            continue
-    return None, None
-
-
-def load_session_data(year, race, session_type):
-    session = fastf1.get_session(year, race, session_type)
-    try:
-        session.load(telemetry=True, weather=False, messages=False)
-        return session
-    except Exception as e:
-        st.error(f"Error loading session: {str(e)}")
-        return None
+startup.start()
 
 
 # Selection area using columns
@@ -60,22 +29,18 @@ with col1:
 
 with col2:
     try:
-        schedule = fastf1.get_event_schedule(selected_year)
+        schedule = session_index.get_schedule(selected_year)
         races = schedule['EventName'].tolist()
         # Get the latest race that has data
-        latest_race_index = 0
-        for idx, race in enumerate(races):
-            session, _ = get_latest_session(selected_year, race)
-            if session is not None:
-                latest_race_index = idx
-                break
+        session_index.refresh(selected_year, schedule)
+        latest_race_index = session_index.first_available_race(selected_year, races)
         selected_race = st.selectbox("Circuit", races, index=latest_race_index)
     except Exception as e:
         st.error(f"Error loading race schedule: {str(e)}")
         st.stop()
 
 # Get latest available session for selected race
-latest_session, session_type_name = get_latest_session(selected_year, selected_race)
+_, session_type_name = get_latest_session(selected_year, selected_race)
 
 with col3:
     session_types = ['Race', 'Qualifying', 'Sprint', 'Practice 3', 'Practice 2', 'Practice 1']
@@ -117,6 +82,9 @@ with st.spinner('Loading session data...'):
 
             st.divider()
 
+            import plotly.graph_objects as go
+            from plotly.subplots import make_subplots
+
             # Analysis Sections
             st.header("1. Basic Session Analysis")
 
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+
+import session_cache
+
+# Built figures are kept as their serialized JSON, keyed by a hash of the
+# figure name and everything it is built from, and shared by every script
+# run of the server process. A rerun caused by a widget a figure does not
+# depend on finds it here instead of building it again; rebuilding the
+# Figure object from the JSON skips plotly's validation.
+MAX_BYTES = int(os.environ.get('F1_FIGURE_CACHE_BYTES', 256 * 1024 ** 2))
+
+# Figures with more points than this in their scatter traces are drawn with
+# WebGL (Scattergl) instead of SVG.
+WEBGL_POINTS = int(os.environ.get('F1_WEBGL_POINTS', '5000'))
+
+figures = session_cache.SessionCache(max_bytes=MAX_BYTES, sizeof=len)
+
+
+def key(name, inputs):
+    return hashlib.sha1(repr((name, inputs)).encode()).hexdigest()
+
+
+def point_count(fig):
+    total = 0
+    for trace in fig.data:
+        if trace.type == 'scatter':
+            values = trace.x if trace.x is not None else trace.y
+            total += len(values) if values is not None else 0
+    return total
+
+
+def webgl(fig, threshold=WEBGL_POINTS):
+    """``fig`` with its scatter traces drawn by WebGL once it is large enough."""
+    import plotly.graph_objects as go
+
+    if point_count(fig) <= threshold:
+        return fig
+    data = []
+    for trace in fig.data:
+        if trace.type == 'scatter':
+            props = trace.to_plotly_json()
+            props.pop('type', None)
+            trace = go.Scattergl(props, skip_invalid=True)
+        data.append(trace)
+    fig.data = ()
+    fig.add_traces(data)
+    return fig
+
+
+def figure(name, inputs, build):
+    """Figure ``name`` built from ``inputs``, built at most once per process.
+
+    ``inputs`` must hold everything the figure depends on (year, race,
+    session, drivers, ...). Returns None, uncached, when ``build`` does.
+    """
+    import plotly.graph_objects as go
+
+    built = []
+
+    def serialize():
+        fig = build()
+        if fig is None:
+            return None
+        built.append(webgl(fig))
+        return built[0].to_json()
+
+    spec = figures.get_or_load(key(name, inputs), serialize)
+    if built:
+        return built[0]
+    if spec is None:
+        return None
+    return go.Figure(json.loads(spec), _validate=False)
+
+
+def stats():
+    return figures.stats()
@@ -0,0 +1,73 @@
+import functools
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import figure_cache
+import profiling
+
+# Helpers for the independently re-executing sections of app.py. A section is
+# an st.fragment: a widget inside it reruns only that section. Sections take
+# their inputs as arguments, keep intermediate results until those inputs
+# change, and sections that other sections depend on publish their outputs so
+# that a change is propagated with a rerun of the whole app.
+_CACHE_KEY = '_fragment_cache'
+_OUTPUT_KEY = '_fragment_outputs'
+
+
+def fragment_rerun():
+    ctx = get_script_run_ctx()
+    return ctx is not None and bool(ctx.fragment_ids_this_run)
+
+
+def fragment(name):
+    """Declare a section; it is timed as its own run when it reruns alone."""
+    def decorate(func):
+        @st.fragment
+        @functools.wraps(func)
+        def section(*args, **kwargs):
+            run = None
+            if fragment_rerun():
+                run = profiling.start_run(f'app.py:{name}')
+            try:
+                with profiling.span(name):
+                    return func(*args, **kwargs)
+            finally:
+                if run is not None:
+                    run.finish()
+        return section
+    return decorate
+
+
+def cached(section, inputs, key, build):
+    """Intermediate ``key`` of ``section``, rebuilt only when ``inputs`` change."""
+    cache = st.session_state.setdefault(_CACHE_KEY, {})
+    entry = cache.get(section)
+    if entry is None or entry['inputs'] != inputs:
+        entry = cache[section] = {'inputs': inputs, 'values': {}}
+    value = entry['values'].get(key)
+    if value is None:
+        # failures (None) are not kept so that they are retried
+        value = build()
+        if value is not None:
+            entry['values'][key] = value
+    return value
+
+
+def figure(section, inputs, key, build):
+    """Like cached(), backed by the figure cache shared with other sessions."""
+    return cached(section, inputs, key, lambda: figure_cache.figure((section, key), inputs, build))
+
+
+def publish(section, outputs):
+    """Record the outputs of ``section`` and return them.
+
+    When they change during a rerun of the section alone, the whole app is
+    rerun so that the sections depending on them see the new values.
+    """
+    published = st.session_state.setdefault(_OUTPUT_KEY, {})
+    changed = published.get(section) != outputs
+    published[section] = outputs
+    if changed and fragment_rerun():
+        st.rerun()
+    return outputs
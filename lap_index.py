@@ -0,0 +1,70 @@
+import numpy as np
+
+TIME_COLUMNS = ['LapTime', 'Sector1Time', 'Sector2Time', 'Sector3Time']
+SPEED_COLUMNS = ['SpeedI1', 'SpeedI2', 'SpeedFL', 'SpeedST']
+
+# The index is kept on the session itself rather than in a weak map keyed by
+# it: its laps refer back to the session, which would keep it alive forever.
+_ATTR = '_lap_index'
+
+
+def seconds_column(column):
+    return f"{column}Seconds"
+
+
+class LapIndex:
+    """Laps of one session grouped by team and driver.
+
+    The laps are sorted once by (Team, Driver, LapNumber), so the laps of any
+    driver or constructor form a contiguous block and can be returned as an
+    ``iloc`` slice instead of a boolean scan over the whole session.
+    """
+
+    def __init__(self, laps):
+        laps = laps.sort_values(['Team', 'Driver', 'LapNumber'], kind='stable')
+        laps = laps.reset_index(drop=True)
+
+        # float32 like the rest of a compacted session (see compact.py)
+        for column in TIME_COLUMNS:
+            if column in laps.columns:
+                laps[seconds_column(column)] = laps[column].dt.total_seconds().astype('float32')
+        for column in SPEED_COLUMNS:
+            if column in laps.columns:
+                laps[column] = laps[column].astype('float32')
+
+        self.laps = laps
+        self._drivers = self._bounds(laps['Driver'].to_numpy())
+        self._teams = self._bounds(laps['Team'].to_numpy())
+
+    @staticmethod
+    def _bounds(values):
+        if len(values) == 0:
+            return {}
+        starts = np.flatnonzero(values[1:] != values[:-1]) + 1
+        starts = np.concatenate(([0], starts))
+        stops = np.concatenate((starts[1:], [len(values)]))
+        return {values[start]: (start, stop) for start, stop in zip(starts, stops)}
+
+    @property
+    def drivers(self):
+        return list(self._drivers)
+
+    @property
+    def teams(self):
+        return list(self._teams)
+
+    def driver(self, driver):
+        start, stop = self._drivers.get(driver, (0, 0))
+        return self.laps.iloc[start:stop]
+
+    def team(self, team):
+        start, stop = self._teams.get(team, (0, 0))
+        return self.laps.iloc[start:stop]
+
+
+def for_session(session):
+    index = getattr(session, _ATTR, None)
+    if index is None:
+        index = LapIndex(session.laps)
+        setattr(session, _ATTR, index)
+    return index
@@ -0,0 +1,138 @@
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+from fastf1.exceptions import DataNotLoadedError
+
+import lap_index
+import telemetry
+
+# Laps are compared on a common distance grid with this spacing in metres.
+GRID_STEP = 5.0
+
+# Channels resampled onto the grid. Elapsed lap time is always resampled as
+# well, as the first column, for the delta-time trace. Discrete channels keep
+# the value of the last sample before each grid point instead of being
+# interpolated.
+CHANNELS = ['Speed', 'Throttle', 'Brake', 'nGear', 'RPM', 'DRS']
+HOLD_CHANNELS = {'Brake', 'nGear', 'DRS'}
+
+_DISTANCE = telemetry.LAP_CHANNELS.index('Distance')
+_SESSION_TIME = telemetry.LAP_CHANNELS.index('SessionTime')
+_COLUMNS = [telemetry.LAP_CHANNELS.index(c) for c in CHANNELS]
+_HOLD = np.array([c in HOLD_CHANNELS for c in ['Time'] + CHANNELS])
+
+_resampled = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def resample(laps, step=GRID_STEP):
+    """Resample the samples of several laps onto the distance grid at once.
+
+    ``laps`` is a list of raw lap sample arrays (LAP_CHANNELS columns). The
+    laps are laid end to end on one distance axis, each shifted past the end
+    of the previous one, so a single searchsorted and a single interpolation
+    over all channels handle every lap. Returns one ``(points, 1 + channels)``
+    array per lap, covering that lap's own length.
+    """
+    laps = [lap[~np.isnan(lap[:, _DISTANCE])] for lap in laps]
+    lengths = np.array([lap[-1, _DISTANCE] for lap in laps])
+    span = lengths.max() + step
+    offsets = np.arange(len(laps)) * span
+
+    xp = np.concatenate([lap[:, _DISTANCE] + offset for lap, offset in zip(laps, offsets)])
+    values = np.concatenate([np.column_stack((lap[:, _SESSION_TIME] - lap[0, _SESSION_TIME], lap[:, _COLUMNS]))
+                             for lap in laps])
+    grids = [np.arange(0, length, step) for length in lengths]
+    x = np.concatenate([grid + offset for grid, offset in zip(grids, offsets)])
+
+    right = np.clip(np.searchsorted(xp, x, side='right'), 1, len(xp) - 1)
+    left = right - 1
+    width = xp[right] - xp[left]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(width > 0, (x - xp[left]) / width, 0.0)
+    out = values[left] + weight[:, None] * (values[right] - values[left])
+    out[:, _HOLD] = values[left][:, _HOLD]
+
+    return np.split(out, np.cumsum([len(grid) for grid in grids])[:-1])
+
+
+def resampled_laps(session, pairs):
+    """Resampled laps of ``(driver, lap_number)`` pairs, cached per session.
+
+    Only pairs not resampled before are computed, in one batch. Laps without
+    telemetry, and drivers whose telemetry is not loaded, map to None.
+    """
+    with _lock:
+        cache = _resampled.setdefault(session, {})
+    missing = [pair for pair in dict.fromkeys(pairs) if pair not in cache]
+
+    samples = {}
+    for driver, lap_number in missing:
+        try:
+            lap_telemetry = telemetry.driver_telemetry(session, driver)
+        except DataNotLoadedError:
+            # not cached, as the telemetry may still be loaded later
+            continue
+        lap = lap_telemetry.samples(lap_number) if lap_number in lap_telemetry else None
+        if lap is None or np.count_nonzero(~np.isnan(lap[:, _DISTANCE])) < 2:
+            cache[(driver, lap_number)] = None
+        else:
+            samples[(driver, lap_number)] = np.asarray(lap, dtype='float64')
+
+    if samples:
+        for pair, grid in zip(samples, resample(list(samples.values()))):
+            cache[pair] = grid
+    return {pair: cache.get(pair) for pair in pairs}
+
+
+def fastest_laps(session, drivers):
+    """``(driver, lap_number)`` of each driver's fastest timed lap."""
+    laps_by_driver = lap_index.for_session(session)
+    pairs = []
+    for driver in drivers:
+        lap_times = laps_by_driver.driver(driver)[['LapNumber', 'LapTimeSeconds']].dropna()
+        if not lap_times.empty:
+            pairs.append((driver, int(lap_times.loc[lap_times['LapTimeSeconds'].idxmin(), 'LapNumber'])))
+    return pairs
+
+
+class LapComparison:
+    """Laps of several drivers on one distance grid.
+
+    ``channels[name]`` and ``time`` are ``(laps, points)`` arrays, truncated to
+    the shortest lap. ``delta`` is the elapsed time of each lap minus that of
+    the reference lap at the same distance: positive means behind.
+    """
+
+    def __init__(self, pairs, grids, reference=0, step=GRID_STEP):
+        points = min(len(grid) for grid in grids)
+        stacked = np.stack([grid[:points] for grid in grids])
+        self.pairs = list(pairs)
+        self.labels = [f"{driver} L{lap_number}" for driver, lap_number in self.pairs]
+        self.reference = reference
+        self.distance = np.arange(points) * step
+        self.time = stacked[:, :, 0]
+        self.channels = {c: stacked[:, :, i + 1] for i, c in enumerate(CHANNELS)}
+        self.delta = self.time - self.time[reference]
+
+    def frame(self, channel):
+        values = self.delta if channel == 'Delta' else self.channels[channel]
+        return pd.DataFrame(values.T, index=pd.Index(self.distance, name='Distance'), columns=self.labels)
+
+
+def compare(session, pairs, reference=0):
+    """Compare ``(driver, lap_number)`` pairs; those without telemetry are left out.
+
+    ``reference`` is the position in ``pairs`` of the reference lap. Returns
+    None when the reference lap has no telemetry.
+    """
+    if not pairs:
+        return None
+    grids = resampled_laps(session, pairs)
+    available = [pair for pair in pairs if grids[pair] is not None]
+    if not available or grids[pairs[reference]] is None:
+        return None
+    return LapComparison(available, [grids[pair] for pair in available],
+                         reference=available.index(pairs[reference]))
@@ -1,13 +1,15 @@
 import streamlit as st
 import fastf1
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime, timedelta
+
+import figure_cache
+import pace
+import prefetch
+import season_cube
+import session_index
+import session_loader
+import startup
+import worker_service
 
 fastf1.Cache.enable_cache('cache')
 
@@ -15,78 +17,13 @@ st.set_page_config(page_title="Aman's Formula 1 Analyser", page_icon="🏎️",
 
 st.title("🏎️ Aman's Formula 1 Analyser - Analytics Project")
 
-
-def load_session_data(year, race, session_type):
-    session = fastf1.get_session(year, race, session_type)
-    session.load()
-    return session
-
-
-def calculate_stint_statistics(laps_data):
-    stint_stats = laps_data.groupby('Stint').agg({
-        'LapTime': ['count', 'mean', 'std', 'min', 'max'],
-        'Compound': lambda x: x.iloc[0],
-        'TyreLife': ['min', 'max'],
-        'SpeedI1': 'mean',
-        'SpeedI2': 'mean',
-        'SpeedFL': 'mean'
-    })
-    return stint_stats
-
-
-def analyze_sector_performance(laps_data):
-    sector_times = pd.DataFrame({
-        'Sector 1': laps_data['Sector1Time'].dt.total_seconds(),
-        'Sector 2': laps_data['Sector2Time'].dt.total_seconds(),
-        'Sector 3': laps_data['Sector3Time'].dt.total_seconds()
-    })
-    return sector_times.describe()
-
-
-def calculate_tire_degradation(laps_data):
-    degradation = laps_data.groupby(['Compound', 'TyreLife'])['LapTime'].mean().reset_index()
-    return degradation
-
-
-def battle_analysis(session_data, driver1, driver2):
-    driver1_laps = session_data.laps.pick_driver(driver1)
-    driver2_laps = session_data.laps.pick_driver(driver2)
-
-    merged_laps = pd.merge(
-        driver1_laps[['LapNumber', 'Position', 'LapTime']],
-        driver2_laps[['LapNumber', 'Position', 'LapTime']],
-        on='LapNumber',
-        suffixes=('_1', '_2')
-    )
-
-    merged_laps['Gap'] = abs(merged_laps['Position_1'] - merged_laps['Position_2'])
-    merged_laps['TimeDiff'] = (merged_laps['LapTime_1'] - merged_laps['LapTime_2']).dt.total_seconds()
-
-    return merged_laps
-
-
-def plot_speed_trace(laps_data, lap_number):
-    lap_telemetry = laps_data.pick_lap(lap_number).get_telemetry()
-
-    fig = make_subplots(rows=2, cols=1, subplot_titles=('Speed Trace', 'Throttle/Brake'))
-
-    fig.add_trace(go.Scatter(x=lap_telemetry['Distance'], y=lap_telemetry['Speed'],
-                             name='Speed', line=dict(color='blue')), row=1, col=1)
-
-    fig.add_trace(go.Scatter(x=lap_telemetry['Distance'], y=lap_telemetry['Throttle'],
-                             name='Throttle', line=dict(color='green')), row=2, col=1)
-    fig.add_trace(go.Scatter(x=lap_telemetry['Distance'], y=lap_telemetry['Brake'] * 100,
-                             name='Brake', line=dict(color='red')), row=2, col=1)
-
-    fig.update_layout(height=800)
-    return fig
-
+startup.start()
 
 years = list(range(2024, 2017, -1))
 selected_year = st.sidebar.selectbox("Select Year", years)
 
 try:
-    schedule = fastf1.get_event_schedule(selected_year)
+    schedule = session_index.get_schedule(selected_year)
     races = schedule['EventName'].tolist()
     selected_race = st.sidebar.selectbox("Select Race", races)
 
@@ -102,79 +39,135 @@ try:
         'Practice 1': 'FP1'
     }
 
-    with st.spinner('Loading session data...'):
-        session = load_session_data(selected_year, selected_race, session_map[selected_session])
+    analysis_views = {
+        "Comprehensive Driver Analysis": 'basic',
+        "Advanced Stint Analysis": 'stints',
+        "Telemetry Deep Dive": 'telemetry',
+        "Head-to-Head Battle Analysis": 'battles',
+        "Race Pace Evolution": 'race_pace',
+        "Season Comparison": 'season'
+    }
+
+    selected_analysis = st.sidebar.selectbox("Analysis Type", list(analysis_views))
+
+    if analysis_views[selected_analysis] == 'season':
+        import plotly.graph_objects as go
+
+        # answered from the season cube, without loading any session
+        cube = season_cube.query(seasons=[selected_year], sessions=[session_map[selected_session]])
+        if cube.empty:
+            st.info(f"No {selected_session} sessions of {selected_year} have been aggregated yet. "
+                    f"They are added as they are loaded, or all at once with `python batch.py {selected_year}`.")
+            st.stop()
+
+        metric = st.selectbox("Metric", [c for c in cube.columns
+                                         if c not in season_cube.KEY_COLUMNS + season_cube.CATEGORY_COLUMNS])
+        cube_drivers = sorted(cube['Driver'].unique())
+        compared = st.multiselect("Select Drivers to Compare", cube_drivers, default=cube_drivers[:3])
+
+        # stints are combined into one value per event: laps are summed, best
+        # and max values taken directly, the rest weighted by stint length
+        cube = cube[cube['Driver'].isin(compared)].assign(Weight=lambda df: df['Laps'].clip(lower=0))
+        if metric == 'Laps':
+            per_event = cube.groupby(['Event', 'Driver'], observed=True)['Weight'].sum()
+        elif metric.endswith('Best'):
+            per_event = cube.groupby(['Event', 'Driver'], observed=True)[metric].min()
+        elif metric.endswith('Max'):
+            per_event = cube.groupby(['Event', 'Driver'], observed=True)[metric].max()
+        else:
+            weighted = cube[metric] * cube['Weight']
+            per_event = weighted.groupby([cube['Event'], cube['Driver']], observed=True).sum() / \
+                cube.groupby(['Event', 'Driver'], observed=True)['Weight'].sum()
+        per_event = per_event.reset_index(name=metric)
+        per_event['Driver'] = per_event['Driver'].astype(str)
+        per_event['Event'] = pd.Categorical(per_event['Event'].astype(str),
+                                            categories=[r for r in races if r in set(per_event['Event'].astype(str))],
+                                            ordered=True)
+        per_event = per_event.sort_values('Event')
+
+        season_fig = go.Figure()
+        for driver in compared:
+            driver_rows = per_event[per_event['Driver'] == driver]
+            season_fig.add_trace(go.Scatter(x=driver_rows['Event'].astype(str), y=driver_rows[metric],
+                                            mode='lines+markers', name=driver))
+        season_fig.update_layout(yaxis_title=metric)
+        st.plotly_chart(season_fig)
+        st.dataframe(per_event.assign(Event=per_event['Event'].astype(str))
+                     .pivot(index='Event', columns='Driver', values=metric).reindex(per_event['Event'].cat.categories))
+        st.stop()
 
-    drivers = pd.unique(session.laps['Driver']).tolist()
+    with st.spinner('Loading session data...'):
+        # loaded here, or by the worker service when F1_WORKER_ADDRESS is set
+        session = worker_service.open_session(selected_year, selected_race, session_map[selected_session],
+                                              session_loader.requirements(analysis_views[selected_analysis]))
+    if session is None:
+        st.stop()
 
-    analysis_options = [
-        "Comprehensive Driver Analysis",
-        "Advanced Stint Analysis",
-        "Telemetry Deep Dive",
-        "Head-to-Head Battle Analysis",
-        "Race Pace Evolution"
-    ]
+    if isinstance(session, worker_service.LocalSession):
+        prefetch.prefetch_around(selected_year, selected_race, session_map[selected_session])
 
-    selected_analysis = st.sidebar.selectbox("Analysis Type", analysis_options)
+    # figures are cached across reruns under the session and their own inputs;
+    # the lap count changes when a live session is reloaded with more laps
+    session_key = (selected_year, selected_race, selected_session, session.call('lap_count'))
+    drivers = session.call('drivers')
 
     if selected_analysis == "Comprehensive Driver Analysis":
         selected_driver = st.selectbox("Select Driver", drivers)
-        driver_laps = session.laps.pick_driver(selected_driver)
 
         col1, col2 = st.columns(2)
 
         with col1:
             st.subheader("Lap Time Distribution")
-            valid_laptimes = driver_laps['LapTime'].dt.total_seconds()
-            fig = go.Figure(data=[go.Histogram(x=valid_laptimes, nbinsx=30)])
-            fig.update_layout(title=f"Lap Time Distribution for {selected_driver}")
+            fig = figure_cache.figure('lap_times', (session_key, selected_driver),
+                                      lambda: session.figure('lap_times', selected_driver))
             st.plotly_chart(fig)
 
             st.subheader("Sector Analysis")
-            sector_stats = analyze_sector_performance(driver_laps)
+            sector_stats = session.call('sector_performance', selected_driver)
             st.dataframe(sector_stats)
 
         with col2:
             st.subheader("Speed Analysis")
-            speed_fig = go.Figure()
-            speed_fig.add_trace(go.Box(y=driver_laps['SpeedI1'], name='Speed Sector 1'))
-            speed_fig.add_trace(go.Box(y=driver_laps['SpeedI2'], name='Speed Sector 2'))
-            speed_fig.add_trace(go.Box(y=driver_laps['SpeedFL'], name='Speed Final'))
+            speed_fig = figure_cache.figure('speeds', (session_key, selected_driver),
+                                            lambda: session.figure('speeds', selected_driver))
             st.plotly_chart(speed_fig)
 
             if selected_session == "Race":
                 st.subheader("Position Changes")
-                pos_fig = go.Figure()
-                pos_fig.add_trace(go.Scatter(x=driver_laps['LapNumber'],
-                                             y=driver_laps['Position'],
-                                             mode='lines+markers'))
-                pos_fig.update_layout(yaxis_autorange="reversed")
+                pos_fig = figure_cache.figure('positions', (session_key, selected_driver),
+                                              lambda: session.figure('positions', selected_driver))
                 st.plotly_chart(pos_fig)
 
     elif selected_analysis == "Advanced Stint Analysis":
         selected_driver = st.selectbox("Select Driver", drivers)
-        driver_laps = session.laps.pick_driver(selected_driver)
 
-        stint_stats = calculate_stint_statistics(driver_laps)
+        stint_stats = session.call('stint_statistics', selected_driver)
         st.subheader("Stint Analysis")
         st.dataframe(stint_stats)
 
-        tire_deg = calculate_tire_degradation(driver_laps)
         st.subheader("Tire Degradation")
-        fig = px.scatter(tire_deg, x='TyreLife', y='LapTime',
-                         color='Compound', trendline="lowess")
-        st.plotly_chart(fig)
+        deg_fig = figure_cache.figure('degradation', (session_key, selected_driver),
+                                      lambda: session.figure('degradation', selected_driver))
+        st.plotly_chart(deg_fig)
+
+        driver_stints, compound_rates = session.call('degradation_tables', selected_driver)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("Degradation per stint (s/lap)")
+            st.dataframe(driver_stints)
+        with col2:
+            st.write("Degradation per compound, whole field (s/lap)")
+            st.dataframe(compound_rates)
 
     elif selected_analysis == "Telemetry Deep Dive":
         selected_driver = st.selectbox("Select Driver", drivers)
-        driver_laps = session.laps.pick_driver(selected_driver)
+        first_lap, last_lap = session.call('lap_range', selected_driver)
 
-        lap_number = st.slider("Select Lap Number",
-                               min_value=int(driver_laps['LapNumber'].min()),
-                               max_value=int(driver_laps['LapNumber'].max()))
+        lap_number = st.slider("Select Lap Number", min_value=first_lap, max_value=last_lap)
 
         st.subheader("Detailed Telemetry Analysis")
-        telemetry_fig = plot_speed_trace(driver_laps, lap_number)
+        telemetry_fig = figure_cache.figure('speed_trace', (session_key, selected_driver, lap_number),
+                                            lambda: session.figure('speed_trace', selected_driver, lap_number))
         st.plotly_chart(telemetry_fig)
 
     elif selected_analysis == "Head-to-Head Battle Analysis":
@@ -184,43 +177,43 @@ try:
         with col2:
             driver2 = st.selectbox("Select Second Driver", drivers, index=1)
 
-        battle_data = battle_analysis(session, driver1, driver2)
-
         st.subheader("Gap Analysis")
-        gap_fig = go.Figure()
-        gap_fig.add_trace(go.Scatter(x=battle_data['LapNumber'],
-                                     y=battle_data['Gap'],
-                                     mode='lines+markers'))
+        gap_fig = figure_cache.figure('battle_gap', (session_key, driver1, driver2),
+                                      lambda: session.figure('battle_gap', driver1, driver2))
         st.plotly_chart(gap_fig)
 
         st.subheader("Lap Time Difference")
-        time_diff_fig = go.Figure()
-        time_diff_fig.add_trace(go.Scatter(x=battle_data['LapNumber'],
-                                           y=battle_data['TimeDiff'],
-                                           mode='lines+markers'))
+        time_diff_fig = figure_cache.figure('battle_time_diff', (session_key, driver1, driver2),
+                                            lambda: session.figure('battle_time_diff', driver1, driver2))
         st.plotly_chart(time_diff_fig)
 
+        st.subheader("Battles Across the Field")
+        battle_threshold = st.slider("Battle Gap Threshold (s)", 0.2, 3.0, 1.0, 0.1)
+        st.dataframe(session.call('battle_summary', battle_threshold))
+
     elif selected_analysis == "Race Pace Evolution":
         if selected_session == "Race":
-            selected_drivers = st.multiselect("Select Drivers to Compare", drivers, default=drivers[:3])
-
-            pace_fig = go.Figure()
-            for driver in selected_drivers:
-                driver_laps = session.laps.pick_driver(driver)
-                rolling_pace = driver_laps['LapTime'].dt.total_seconds().rolling(window=5).mean()
-                pace_fig.add_trace(go.Scatter(x=driver_laps['LapNumber'],
-                                              y=rolling_pace,
-                                              name=driver))
+            selected_drivers = tuple(st.multiselect("Select Drivers to Compare", drivers, default=drivers[:3]))
+            pace_metric = st.selectbox("Pace Metric", list(pace.METRICS), format_func=pace.METRICS.get)
+            st.caption("Pit laps and laps under yellow flag, safety car or VSC are left out.")
 
+            # whole field computed once per session, selection only picks columns
+            pace_fig = figure_cache.figure('pace', (session_key, selected_drivers, pace_metric),
+                                           lambda: session.figure('pace', selected_drivers, pace_metric))
             st.plotly_chart(pace_fig)
 
-            fuel_effect = pd.DataFrame()
-            for driver in selected_drivers:
-                driver_laps = session.laps.pick_driver(driver)
-                fuel_effect[driver] = driver_laps['LapTime'].dt.total_seconds()
+            st.subheader("Gap to Leader")
+            leader_fig = figure_cache.figure('gap_to_leader', (session_key, selected_drivers),
+                                             lambda: session.figure('gap_to_leader', selected_drivers))
+            st.plotly_chart(leader_fig)
+
+            first_lap, last_lap = session.call('race_laps')
+            order_lap = st.slider("Running Order at Lap", min_value=first_lap, max_value=last_lap, value=last_lap)
+            st.dataframe(session.call('running_order', order_lap))
 
             st.subheader("Fuel Effect Analysis")
-            fuel_fig = px.line(fuel_effect)
+            fuel_fig = figure_cache.figure('fuel_effect', (session_key, selected_drivers),
+                                           lambda: session.figure('fuel_effect', selected_drivers))
             st.plotly_chart(fuel_fig)
         else:
             st.info("Race Pace Evolution analysis is only available for race sessions.")
@@ -0,0 +1,86 @@
+import weakref
+
+import pandas as pd
+
+import lap_index
+
+_models = weakref.WeakKeyDictionary()
+
+WINDOW = 5
+METRICS = {
+    'RollingMean': f"{WINDOW}-lap rolling mean",
+    'EWMA': f"Exponentially weighted mean (span {WINDOW})",
+    'RollingMedian': f"{WINDOW}-lap rolling median",
+}
+GREEN = '1'
+
+
+def clean_mask(laps):
+    """Laps that reflect race pace: timed, not in- or out-laps, green flag.
+
+    TrackStatus lists every status seen during the lap, so any lap that had a
+    yellow, safety car, VSC or red flag is left out.
+    """
+    mask = laps['LapTime'].notna()
+    for column in ('PitInTime', 'PitOutTime'):
+        if column in laps.columns:
+            mask &= laps[column].isna()
+    if 'TrackStatus' in laps.columns:
+        mask &= laps['TrackStatus'].astype(str).str.fullmatch(f"{GREEN}+").fillna(False).astype(bool)
+    return mask
+
+
+class PaceModel:
+    """Rolling race pace of every driver of a session.
+
+    ``laps`` has one row per lap with ``Clean`` set for laps used for pace and
+    the rolling mean, EWMA and rolling median over each driver's last clean
+    laps. All drivers are computed together in one grouped pass, so looking
+    at more drivers costs nothing extra.
+    """
+
+    def __init__(self, laps, window=WINDOW):
+        self.window = window
+        lap_time = lap_index.seconds_column('LapTime')
+        if lap_time not in laps.columns:
+            laps = laps.assign(**{lap_time: laps['LapTime'].dt.total_seconds()})
+
+        frame = pd.DataFrame({
+            'Driver': laps['Driver'].to_numpy(),
+            'LapNumber': laps['LapNumber'].to_numpy(),
+            'LapTimeSeconds': laps[lap_time].to_numpy(),
+            'Clean': clean_mask(laps).to_numpy(),
+        }).sort_values(['Driver', 'LapNumber'], kind='stable').reset_index(drop=True)
+
+        clean = frame[frame['Clean']]
+        groups = clean.groupby('Driver', sort=False)['LapTimeSeconds']
+        rolling = groups.rolling(window, min_periods=window)
+        for column, values in (('RollingMean', rolling.mean()),
+                               ('EWMA', groups.ewm(span=window).mean()),
+                               ('RollingMedian', rolling.median())):
+            frame[column] = values.reset_index(level=0, drop=True)
+
+        self.laps = frame
+        self.drivers = list(pd.unique(frame['Driver']))
+
+    def driver(self, driver, clean_only=True):
+        laps = self.laps[self.laps['Driver'] == driver]
+        return laps[laps['Clean']] if clean_only else laps
+
+    def wide(self, column, drivers=None, clean_only=True):
+        """Lap x driver table of ``column``, aligned on LapNumber."""
+        laps = self.laps[self.laps['Clean']] if clean_only else self.laps
+        if drivers is not None:
+            laps = laps[laps['Driver'].isin(drivers)]
+        table = laps.pivot(index='LapNumber', columns='Driver', values=column)
+        if drivers is not None:
+            table = table.reindex(columns=[d for d in drivers if d in table.columns])
+        return table
+
+
+def for_session(session):
+    model = _models.get(session)
+    if model is None:
+        model = PaceModel(lap_index.for_session(session).laps)
+        _models[session] = model
+    return model
@@ -0,0 +1,166 @@
+import contextlib
+import heapq
+import itertools
+import logging
+import os
+import threading
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import session_cache
+import session_index
+import session_loader
+
+_logger = logging.getLogger(__name__)
+
+# Sessions a user is likely to open next are loaded into the session cache in
+# the background: the other sessions of the selected event first, then the
+# latest session of the neighbouring events. F1_PREFETCH_WORKERS=0 disables it.
+WORKERS = int(os.environ.get('F1_PREFETCH_WORKERS', '1'))
+NEIGHBOUR_EVENTS = int(os.environ.get('F1_PREFETCH_EVENTS', '1'))
+MAX_QUEUE = 12
+
+# Prefetching stops once the session cache is this full, so that it never
+# evicts what the foreground has loaded.
+MEMORY_FRACTION = float(os.environ.get('F1_PREFETCH_MEMORY', '0.6'))
+
+PARTS = session_loader.requirements('competitors', 'basic', 'sectors')
+
+# lower runs first; neighbouring events are ranked by distance, the next
+# event ahead of the previous one
+SAME_EVENT_PRIORITY = 0
+EVENT_PRIORITY = 10
+
+
+def candidates(year, race, session_type, races, events=NEIGHBOUR_EVENTS):
+    """(priority, key) of the sessions to prefetch around the selected one."""
+    tasks = []
+    if session_type in session_index.SESSION_ORDER:
+        position = session_index.SESSION_ORDER.index(session_type)
+        for idx, other in enumerate(session_index.SESSION_ORDER):
+            if other != session_type and session_index.lookup(year, race, other):
+                tasks.append((SAME_EVENT_PRIORITY + abs(idx - position), (year, race, other)))
+
+    if race in races:
+        idx = races.index(race)
+        for distance in range(1, events + 1):
+            for offset, bias in ((distance, 0), (-distance, 5)):
+                if not 0 <= idx + offset < len(races):
+                    continue
+                other_race = races[idx + offset]
+                other_type = session_index.latest_session_type(year, other_race)
+                if other_type is not None:
+                    tasks.append((EVENT_PRIORITY * distance + bias, (year, other_race, other_type)))
+    return sorted(tasks)
+
+
+class Prefetcher:
+    def __init__(self, workers=WORKERS, cache=None, memory_fraction=MEMORY_FRACTION,
+                 parts=PARTS, max_queue=MAX_QUEUE):
+        self.workers = workers
+        self.cache = session_cache.sessions if cache is None else cache
+        self.memory_fraction = memory_fraction
+        self.parts = parts
+        self.max_queue = max_queue
+        self.counts = {'scheduled': 0, 'loaded': 0, 'cached': 0, 'cancelled': 0,
+                       'skipped': 0, 'failed': 0}
+        self._queue = []
+        self._seq = itertools.count()
+        self._foreground = 0
+        self._threads = []
+        self._cond = threading.Condition()
+
+    def submit(self, tasks, owner=None):
+        """Queue ``(priority, key)`` tasks, cancelling the ones ``owner`` queued
+        before. Tasks queued by other owners are kept."""
+        if self.workers <= 0:
+            return
+        with self._cond:
+            kept = [task for task in self._queue if task[3] != owner]
+            self.counts['cancelled'] += len(self._queue) - len(kept)
+            added = [(priority, next(self._seq), key, owner) for priority, key in tasks[:self.max_queue]]
+            self._queue = kept + added
+            heapq.heapify(self._queue)
+            self.counts['scheduled'] += len(added)
+            self._start_workers()
+            self._cond.notify_all()
+
+    def cancel(self):
+        with self._cond:
+            self.counts['cancelled'] += len(self._queue)
+            self._queue = []
+
+    @contextlib.contextmanager
+    def foreground(self):
+        """Hold back new prefetches while a foreground load runs."""
+        with self._cond:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._foreground -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return dict(self.counts, queued=len(self._queue), foreground=self._foreground)
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f'f1-prefetch-{len(self._threads)}',
+                                      daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _memory_available(self):
+        stats = self.cache.stats()
+        return stats['bytes'] < stats['max_bytes'] * self.memory_fraction
+
+    def _next(self):
+        with self._cond:
+            while not self._queue or self._foreground:
+                self._cond.wait()
+            return heapq.heappop(self._queue)[2]
+
+    def _count(self, name):
+        with self._cond:
+            self.counts[name] += 1
+
+    def _work(self):
+        while True:
+            key = self._next()
+            if key in self.cache.keys():
+                self._count('cached')
+                continue
+            if not self._memory_available():
+                self._count('skipped')
+                continue
+            try:
+                session_loader.get_session(*key, parts=self.parts)
+                self._count('loaded')
+            except Exception as e:
+                self._count('failed')
+                session_index.mark(*key, False)
+                _logger.info(f"Prefetch of {key} failed: {e}")
+
+
+prefetcher = Prefetcher()
+_SELECTED_KEY = '_prefetch_selected'
+
+
+def prefetch_around(year, race, session_type):
+    # reruns for the same selection keep the queue that is already running;
+    # each user's selection replaces only that user's queued prefetches
+    selection = (year, race, session_type)
+    if st.session_state.get(_SELECTED_KEY) == selection:
+        return
+    st.session_state[_SELECTED_KEY] = selection
+    try:
+        races = session_index.get_schedule(year)['EventName'].tolist()
+    except Exception:
+        races = []
+    ctx = get_script_run_ctx()
+    prefetcher.submit(candidates(year, race, session_type, races),
+                      owner=ctx.session_id if ctx is not None else None)
@@ -0,0 +1,180 @@
+import contextlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Budget of each named span in milliseconds. Spans over budget are logged as
+# warnings and highlighted in the profiling panel. Override with
+# F1_PROFILE_BUDGETS="session_load=3000,telemetry=1000".
+BUDGETS_MS = {
+    'schedule': 1500,
+    'latest_session': 100,
+    'session_load': 4000,
+    'competitors': 100,
+    'basic': 500,
+    'sectors': 500,
+    'telemetry': 1500,
+    'race_pace': 500,
+}
+for _entry in os.environ.get('F1_PROFILE_BUDGETS', '').split(','):
+    if '=' in _entry:
+        _name, _ms = _entry.split('=', 1)
+        BUDGETS_MS[_name.strip()] = float(_ms)
+
+# Show the profiling panel by default (it can also be switched on in the app).
+PANEL = os.environ.get('F1_PROFILE_PANEL', '0') == '1'
+
+# One JSON line per run goes to stderr unless F1_PROFILE_LOG=0; the logger can
+# also be routed elsewhere through the usual logging configuration.
+if os.environ.get('F1_PROFILE_LOG', '1') == '1' and not _logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+    _logger.addHandler(_handler)
+    _logger.setLevel(logging.INFO)
+
+_run_ids = itertools.count(1)
+_local = threading.local()
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Run:
+    """Timing spans of one script run.
+
+    Every span records its offset from the start of the run, its duration and
+    how much the resident set size changed while it ran, so a waterfall of the
+    run can be drawn afterwards.
+    """
+
+    def __init__(self, script):
+        self.script = script
+        self.run_id = next(_run_ids)
+        self.started = time.time()
+        self.spans = []
+        self._start = time.perf_counter()
+        self._depth = 0
+        self._record = None
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        rss = rss_bytes()
+        depth = self._depth
+        self._depth += 1
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._depth = depth
+            duration_ms = (time.perf_counter() - start) * 1000
+            budget = BUDGETS_MS.get(name)
+            self.spans.append({
+                'name': name,
+                'start_ms': (start - self._start) * 1000,
+                'duration_ms': duration_ms,
+                'rss_delta': rss_bytes() - rss,
+                'depth': depth,
+                'budget_ms': budget,
+                'over_budget': budget is not None and duration_ms > budget,
+                'error': error,
+            })
+
+    def over_budget(self):
+        return [span for span in self.spans if span['over_budget']]
+
+    def finish(self):
+        if self._record is not None:
+            return self._record
+
+        self._record = {
+            'script': self.script,
+            'run': self.run_id,
+            'started': self.started,
+            'total_ms': (time.perf_counter() - self._start) * 1000,
+            'rss': rss_bytes(),
+            'spans': sorted(self.spans, key=lambda span: span['start_ms']),
+        }
+        _logger.info(json.dumps(self._record))
+        for span in self.over_budget():
+            _logger.warning(f"{self.script} run {self.run_id}: {span['name']} took "
+                            f"{span['duration_ms']:.0f} ms (budget {span['budget_ms']:.0f} ms)")
+        if _current() is self:
+            _local.run = None
+        return self._record
+
+
+def _current():
+    return getattr(_local, 'run', None)
+
+
+def start_run(script):
+    # a run cut short by st.stop() or an exception is still logged
+    previous = _current()
+    if previous is not None:
+        previous.finish()
+    _local.run = Run(script)
+    return _local.run
+
+
+@contextlib.contextmanager
+def span(name):
+    """Span of the current run of this thread; does nothing outside of a run."""
+    run = _current()
+    if run is None:
+        yield
+        return
+    with run.span(name):
+        yield
+
+
+def waterfall(record):
+    import plotly.graph_objects as go
+
+    spans = record['spans']
+    fig = go.Figure(go.Bar(
+        y=[f"{'  ' * s['depth']}{s['name']}" for s in spans],
+        x=[s['duration_ms'] for s in spans],
+        base=[s['start_ms'] for s in spans],
+        orientation='h',
+        marker_color=['red' if s['over_budget'] else 'steelblue' for s in spans],
+        customdata=[s['rss_delta'] / 2 ** 20 for s in spans],
+        hovertemplate="%{y}: %{x:.0f} ms, RSS %{customdata:+.1f} MiB<extra></extra>",
+    ))
+    fig.update_layout(
+        yaxis_autorange="reversed",
+        xaxis_title="Time since start of run (ms)",
+        height=120 + 30 * len(spans),
+        margin=dict(t=20, b=40),
+    )
+    return fig
+
+
+def render_panel(record):
+    import pandas as pd
+    import streamlit as st
+
+    with st.expander(f"Profiling: run {record['run']} took {record['total_ms']:.0f} ms", expanded=True):
+        for span in record['spans']:
+            if span['over_budget']:
+                st.warning(f"{span['name']} took {span['duration_ms']:.0f} ms "
+                           f"(budget {span['budget_ms']:.0f} ms)")
+        st.plotly_chart(waterfall(record), use_container_width=True)
+        table = pd.DataFrame(record['spans'])
+        table['rss_delta_mib'] = table['rss_delta'] / 2 ** 20
+        st.dataframe(table[['name', 'start_ms', 'duration_ms', 'budget_ms', 'rss_delta_mib']],
+                     use_container_width=True)
@@ -0,0 +1,139 @@
+import weakref
+
+import numpy as np
+import pandas as pd
+
+_matrices = weakref.WeakKeyDictionary()
+
+
+class LapMatrix:
+    """Lap x driver matrices of one session with all driver pairs precomputed.
+
+    Position, LapTime and the session Time at the end of each lap are pivoted
+    once into ``(n_laps, n_drivers)`` arrays. The pairwise differences are then
+    broadcast into ``(n_laps, n_drivers, n_drivers)`` arrays, so comparing any
+    two drivers is an index lookup. ``gap[lap, i, j]`` is how many seconds
+    driver ``i`` crossed the line after driver ``j`` on that lap.
+    """
+
+    def __init__(self, laps):
+        laps = laps[laps['LapNumber'].notna()]
+        self.drivers = list(pd.unique(laps['Driver']))
+        self.lap_numbers = np.sort(pd.unique(laps['LapNumber'])).astype('int64')
+        self._columns = {driver: j for j, driver in enumerate(self.drivers)}
+        self._rows = {int(n): i for i, n in enumerate(self.lap_numbers)}
+
+        rows = np.searchsorted(self.lap_numbers, laps['LapNumber'].to_numpy().astype('int64'))
+        cols = laps['Driver'].map(self._columns).to_numpy()
+        shape = (len(self.lap_numbers), len(self.drivers))
+
+        def pivot(values):
+            matrix = np.full(shape, np.nan)
+            matrix[rows, cols] = values
+            return matrix
+
+        self.present = np.zeros(shape, dtype=bool)
+        self.present[rows, cols] = True
+        self.position = pivot(laps['Position'].to_numpy(dtype='float64'))
+        self.lap_time = pivot(laps['LapTime'].dt.total_seconds().to_numpy())
+        self.time = pivot(laps['Time'].dt.total_seconds().to_numpy())
+
+        self.gap = self.time[:, :, None] - self.time[:, None, :]
+        self.position_delta = self.position[:, :, None] - self.position[:, None, :]
+        self.lap_time_delta = self.lap_time[:, :, None] - self.lap_time[:, None, :]
+        self._running_order()
+
+    def _running_order(self):
+        """Gap to the leader and interval to the car ahead on every lap.
+
+        On each lap the cars are ordered by the session time at which they
+        completed it, so ``order[lap, k]`` is the column of the car in
+        position ``k + 1`` on the road at the end of that lap.
+        """
+        time = np.where(np.isnan(self.time), np.inf, self.time)
+        self.order = np.argsort(time, axis=1, kind='stable')
+        ordered = np.take_along_axis(self.time, self.order, axis=1)
+
+        with np.errstate(invalid='ignore'):
+            leader = ordered[:, :1] if ordered.shape[1] else ordered
+            self.gap_to_leader = self.time - leader
+            ordered_interval = np.diff(ordered, axis=1, prepend=np.nan)
+        ordered_interval[:, 0] = np.where(np.isnan(ordered[:, 0]), np.nan, 0.0)
+
+        ahead = np.full(self.order.shape, -1, dtype='int64')
+        ahead[:, 1:] = self.order[:, :-1]
+        self.interval = np.full(self.time.shape, np.nan)
+        self.car_ahead = np.full(self.time.shape, -1, dtype='int64')
+        rows = np.arange(self.time.shape[0])[:, None]
+        self.interval[rows, self.order] = ordered_interval
+        self.car_ahead[rows, self.order] = ahead
+        self.car_ahead[~self.present] = -1
+
+    def gaps(self, column='gap_to_leader', drivers=None):
+        """Lap x driver DataFrame of ``gap_to_leader`` or ``interval``."""
+        drivers = self.drivers if drivers is None else [d for d in drivers if d in self._columns]
+        values = getattr(self, column)[:, [self._columns[d] for d in drivers]]
+        return pd.DataFrame(values, index=pd.Index(self.lap_numbers, name='LapNumber'), columns=drivers)
+
+    def running_order(self, lap_number):
+        """The field on one lap: road position, gap to leader and interval."""
+        row = self._rows[int(lap_number)]
+        order = self.order[row][self.present[row, self.order[row]]]
+        names = np.array(self.drivers, dtype=object)
+        ahead = self.car_ahead[row, order]
+        return pd.DataFrame({
+            'Driver': names[order],
+            'Position': self.position[row, order],
+            'GapToLeader': self.gap_to_leader[row, order],
+            'Interval': self.interval[row, order],
+            'CarAhead': np.where(ahead >= 0, names[np.maximum(ahead, 0)], None),
+        })
+
+    def pair(self, driver1, driver2):
+        i, j = self._columns[driver1], self._columns[driver2]
+        both = self.present[:, i] & self.present[:, j]
+        return pd.DataFrame({
+            'LapNumber': self.lap_numbers[both],
+            'Position_1': self.position[both, i],
+            'Position_2': self.position[both, j],
+            'LapTime_1': self.lap_time[both, i],
+            'LapTime_2': self.lap_time[both, j],
+            'Gap': self.gap[both, i, j],
+            'PositionDelta': self.position_delta[both, i, j],
+            'TimeDiff': self.lap_time_delta[both, i, j],
+        })
+
+    def battle_summary(self, threshold=1.0):
+        """Summary of every driver pair over the whole session.
+
+        Counts the laps on which the two cars were within ``threshold`` seconds
+        of each other and the number of times they swapped positions.
+        """
+        abs_gap = np.abs(self.gap)
+        valid = ~np.isnan(abs_gap)
+        close = (valid & (abs_gap < threshold)).sum(axis=0)
+        total = np.where(valid, abs_gap, 0.0).sum(axis=0)
+        count = valid.sum(axis=0)
+        mean_gap = np.divide(total, count, out=np.full(total.shape, np.nan), where=count > 0)
+
+        order = np.sign(self.position_delta)
+        swaps = ((order[1:] * order[:-1]) < 0).sum(axis=0)
+
+        i, j = np.triu_indices(len(self.drivers), k=1)
+        summary = pd.DataFrame({
+            'Driver1': np.array(self.drivers, dtype=object)[i],
+            'Driver2': np.array(self.drivers, dtype=object)[j],
+            'LapsWithin': close[i, j],
+            'PositionSwaps': swaps[i, j],
+            'MeanGap': mean_gap[i, j],
+        })
+        return summary.sort_values(['LapsWithin', 'PositionSwaps'], ascending=False) \
+            .reset_index(drop=True)
+
+
+def for_session(session):
+    matrix = _matrices.get(session)
+    if matrix is None:
+        matrix = LapMatrix(session.laps)
+        _matrices[session] = matrix
+    return matrix
@@ -0,0 +1,241 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+_logger = logging.getLogger(__name__)
+
+# A local stand-in for the timing, schedule and Ergast endpoints fastf1
+# downloads from. Responses are replayed from an archive directory, so loads
+# that miss the fastf1 cache do not go out to the network. In record mode,
+# requests missing from the archive are forwarded upstream and their
+# responses added to it.
+ARCHIVE_DIR = os.environ.get('F1_REPLAY_ARCHIVE', 'replay_archive')
+PORT = int(os.environ.get('F1_REPLAY_PORT', '8620'))
+
+# Base URL of a running replay server, e.g. http://localhost:8620. When set,
+# the session and schedule loaders send every fastf1 request to it instead of
+# the real endpoints.
+REPLAY_URL = os.environ.get('F1_REPLAY_URL', '')
+
+UPSTREAM_TIMEOUT = 30
+
+# request headers not forwarded upstream, response headers not replayed
+# (bodies are archived decoded)
+_HOP_HEADERS = {'host', 'connection', 'content-length', 'accept-encoding', 'content-encoding',
+                'transfer-encoding', 'keep-alive', 'server', 'date'}
+
+
+def canonical_url(url):
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{parts.scheme}://{parts.netloc}{parts.path}" + (f"?{query}" if query else '')
+
+
+class Archive:
+    """Recorded responses, two files per request: ``<key>.json`` with the
+    request and response metadata and ``<key>.body`` with the body."""
+
+    def __init__(self, path=ARCHIVE_DIR):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(method, url, body=b''):
+        digest = hashlib.sha1(f"{method.upper()} {canonical_url(url)}".encode())
+        digest.update(body or b'')
+        return digest.hexdigest()
+
+    def get(self, method, url, body=b''):
+        """``(status, headers, body)`` recorded for the request, or None."""
+        path = os.path.join(self.path, self.key(method, url, body))
+        try:
+            with open(path + '.json') as f:
+                meta = json.load(f)
+            with open(path + '.body', 'rb') as f:
+                return meta['status'], meta['headers'], f.read()
+        except (OSError, ValueError):
+            return None
+
+    def put(self, method, url, status, headers, content, body=b''):
+        path = os.path.join(self.path, self.key(method, url, body))
+        headers = {k: v for k, v in headers.items() if k.lower() not in _HOP_HEADERS}
+        meta = {'method': method.upper(), 'url': canonical_url(url), 'status': status, 'headers': headers}
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(path + '.body.tmp', 'wb') as f:
+                f.write(content)
+            with open(path + '.json.tmp', 'w') as f:
+                json.dump(meta, f, indent=1)
+            os.replace(path + '.body.tmp', path + '.body')
+            os.replace(path + '.json.tmp', path + '.json')
+
+    def __len__(self):
+        try:
+            return sum(name.endswith('.json') for name in os.listdir(self.path))
+        except OSError:
+            return 0
+
+
+def seed(archive, cache_dir='cache'):
+    """Add the raw responses in fastf1's requests cache to ``archive``.
+
+    fastf1's parsed ``.ff1pkl`` files are not HTTP responses and keep being
+    used from the cache directly. Returns the number of responses added.
+    """
+    from requests_cache import SQLiteCache
+
+    path = os.path.join(cache_dir, 'fastf1_http_cache.sqlite')
+    if not os.path.exists(path):
+        return 0
+    added = 0
+    for response in SQLiteCache(path).responses.values():
+        request = response.request
+        body = request.body or b''
+        if isinstance(body, str):
+            body = body.encode()
+        if archive.get(request.method, request.url, body) is None:
+            archive.put(request.method, request.url, response.status_code, dict(response.headers),
+                        response.content, body)
+            added += 1
+    return added
+
+
+def upstream_url(path):
+    """``/https/host/path?query`` -> ``https://host/path?query``."""
+    scheme, _, rest = path.lstrip('/').partition('/')
+    return f"{scheme}://{rest}"
+
+
+def replay_url(url, base=REPLAY_URL):
+    """``https://host/path?query`` -> ``<base>/https/host/path?query``."""
+    if url.startswith(base):
+        return url
+    parts = urlsplit(url)
+    query = f"?{parts.query}" if parts.query else ''
+    return f"{base.rstrip('/')}/{parts.scheme}/{parts.netloc}{parts.path}{query}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _respond(self, status, headers, content):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _replay(self, method):
+        if self.path == '/status':
+            return self._respond(200, {'Content-Type': 'application/json'},
+                                 json.dumps(self.server.status()).encode())
+        url = upstream_url(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        recorded = self.server.archive.get(method, url, body)
+        if recorded is None and self.server.record:
+            recorded = self.server.fetch(method, url, body, self.headers)
+        self.server.count('hits' if recorded is not None else 'misses')
+        if recorded is None and self.server.record:
+            return self._respond(502, {'Content-Type': 'text/plain'}, b"Upstream request failed")
+        if recorded is None:
+            _logger.warning(f"Not in the replay archive: {method} {url}")
+            return self._respond(404, {'Content-Type': 'text/plain'}, b"Not in the replay archive")
+        self._respond(*recorded)
+
+    def do_GET(self):
+        self._replay('GET')
+
+    def do_POST(self):
+        self._replay('POST')
+
+    def log_message(self, format, *args):
+        _logger.debug(format % args)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, archive, record=False):
+        super().__init__(address, _Handler)
+        self.archive = archive
+        self.record = record
+        self._stats = {'hits': 0, 'misses': 0, 'recorded': 0, 'upstream_errors': 0}
+        self._stats_lock = threading.Lock()
+
+    def count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def fetch(self, method, url, body, headers):
+        import requests
+
+        headers = {k: v for k, v in headers.items() if k.lower() not in _HOP_HEADERS}
+        try:
+            response = requests.request(method, url, data=body or None, headers=headers,
+                                        timeout=UPSTREAM_TIMEOUT)
+        except requests.RequestException as e:
+            _logger.warning(f"Could not record {method} {url}: {e}")
+            self.count('upstream_errors')
+            return None
+        # server errors are passed on but not archived, so they are retried
+        if response.status_code < 500:
+            self.archive.put(method, url, response.status_code, dict(response.headers), response.content, body)
+            self.count('recorded')
+        return response.status_code, {k: v for k, v in response.headers.items()
+                                      if k.lower() not in _HOP_HEADERS}, response.content
+
+    def status(self):
+        with self._stats_lock:
+            return dict(self._stats, record=self.record, archived=len(self.archive))
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install(url=REPLAY_URL):
+    """Send fastf1's requests to the replay server at ``url``, if one is set."""
+    global _installed
+    if not url:
+        return False
+    from fastf1.req import Cache
+
+    with _install_lock:
+        if not _installed:
+            get, post = Cache.requests_get.__func__, Cache.requests_post.__func__
+            Cache.requests_get = classmethod(lambda cls, u, **kwargs: get(cls, replay_url(u, url), **kwargs))
+            Cache.requests_post = classmethod(lambda cls, u, **kwargs: post(cls, replay_url(u, url), **kwargs))
+            _installed = True
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded fastf1 API responses from a local archive.")
+    parser.add_argument('command', choices=['serve', 'seed'])
+    parser.add_argument('--archive', default=ARCHIVE_DIR)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--record', action='store_true', help="fetch and archive requests that are missing")
+    parser.add_argument('--cache', default='cache', help="fastf1 cache directory to seed the archive from")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    archive = Archive(args.archive)
+    if args.command == 'seed':
+        print(f"{seed(archive, args.cache)} responses added, {len(archive)} archived")
+        return 0
+
+    added = seed(archive, args.cache)
+    server = ReplayServer(('localhost', args.port), archive, record=args.record)
+    _logger.info(f"Replaying {len(archive)} responses ({added} new from {args.cache}) from {args.archive} "
+                 f"on port {args.port}"
+                 + (", recording missing ones" if args.record else ''))
+    server.serve_forever()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,182 @@
+import argparse
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import lap_index
+import session_store
+
+_logger = logging.getLogger(__name__)
+
+# Per-stint aggregates of every stored session, so that questions spanning a
+# whole season are answered without loading the sessions again. One row per
+# (Season, Event, Session, Driver, Stint), one Parquet file per session:
+#   <store>/cube/season=<year>/event=<event>/session=<type>/part-0.parquet
+# Adding a session only writes its own file.
+CUBE_NAME = 'cube'
+KEY_COLUMNS = ['Season', 'Event', 'Session', 'Driver', 'Stint']
+CATEGORY_COLUMNS = ['Event', 'Session', 'Driver', 'Team', 'Compound']
+
+SECTORS = ['Sector1', 'Sector2', 'Sector3']
+SPEED_TRAPS = ['SpeedI1', 'SpeedI2', 'SpeedFL', 'SpeedST']
+
+
+def cube_dir():
+    return os.path.join(session_store.STORE_DIR, CUBE_NAME)
+
+
+def partition_path(year, race, session_type):
+    return os.path.join(cube_dir(), f"season={year}", f"event={str(race).replace(' ', '_')}",
+                        f"session={session_type}")
+
+
+def has_session(year, race, session_type):
+    return os.path.exists(os.path.join(partition_path(year, race, session_type), 'part-0.parquet'))
+
+
+def aggregate(session, year, race, session_type):
+    """Stint level aggregates of a session.
+
+    Holds the statistics of calculate_stint_statistics() and
+    analyze_sector_performance() per stint, computed in one groupby over the
+    whole field rather than per driver.
+    """
+    # not lap_index.for_session(): this runs before the session is compacted,
+    # and the cached index would keep the uncompacted laps
+    laps = lap_index.LapIndex(session.laps).laps
+    laps = laps[laps['Stint'].notna()]
+    if laps.empty:
+        return pd.DataFrame(columns=KEY_COLUMNS)
+
+    lap_time = lap_index.seconds_column('LapTime')
+    groups = laps.groupby(['Driver', 'Stint'], sort=True, observed=True)
+
+    columns = {
+        'Team': groups['Team'].first(),
+        'Compound': groups['Compound'].first(),
+        'Laps': groups[lap_time].count(),
+        'LapTimeMean': groups[lap_time].mean(),
+        'LapTimeStd': groups[lap_time].std(),
+        'LapTimeBest': groups[lap_time].min(),
+        'LapTimeMedian': groups[lap_time].median(),
+        'LapTimeMax': groups[lap_time].max(),
+        'TyreLifeStart': groups['TyreLife'].min(),
+        'TyreLifeEnd': groups['TyreLife'].max(),
+    }
+    for sector in SECTORS:
+        seconds = groups[lap_index.seconds_column(f'{sector}Time')]
+        columns[f'{sector}Mean'] = seconds.mean()
+        columns[f'{sector}Best'] = seconds.min()
+        columns[f'{sector}Median'] = seconds.median()
+    for trap in SPEED_TRAPS:
+        speeds = groups[trap]
+        columns[f'{trap}Mean'] = speeds.mean()
+        columns[f'{trap}Max'] = speeds.max()
+        columns[f'{trap}Median'] = speeds.median()
+
+    cube = pd.DataFrame(columns).reset_index()
+    cube.insert(0, 'Session', session_type)
+    cube.insert(0, 'Event', race)
+    cube.insert(0, 'Season', year)
+    return compact(cube)
+
+
+def compact(cube):
+    cube = cube.copy()
+    cube['Season'] = cube['Season'].astype('int16')
+    cube['Stint'] = cube['Stint'].astype('int8')
+    for column in ('Laps', 'TyreLifeStart', 'TyreLifeEnd'):
+        cube[column] = cube[column].fillna(-1).astype('int16')
+    for column in CATEGORY_COLUMNS:
+        cube[column] = cube[column].astype('string').astype('category')
+    for column in cube.columns:
+        if cube[column].dtype == np.float64:
+            cube[column] = cube[column].astype('float32')
+    return cube
+
+
+def add_session(session, year, race, session_type, force=False):
+    """Write the aggregates of a session; returns False if already present."""
+    if not force and has_session(year, race, session_type):
+        return False
+    cube = aggregate(session, year, race, session_type)
+    if cube.empty:
+        return False
+    path = partition_path(year, race, session_type)
+    os.makedirs(path, exist_ok=True)
+    target = os.path.join(path, 'part-0.parquet')
+    pq.write_table(pa.Table.from_pandas(cube, preserve_index=False), target + '.tmp')
+    os.replace(target + '.tmp', target)
+    return True
+
+
+def update(session, year, race, session_type):
+    """Add a finished session that is not in the cube yet, logging failures."""
+    if has_session(year, race, session_type) or not session_store.is_final(session):
+        return False
+    try:
+        return add_session(session, year, race, session_type)
+    except Exception as e:
+        _logger.warning(f"Could not add {year} {race} {session_type} to the season cube: {e}")
+        return False
+
+
+def _isin(field, values):
+    return ds.field(field).isin(list(values))
+
+
+def query(seasons=None, events=None, sessions=None, drivers=None, columns=None):
+    """Rows of the cube matching the given filters (None matches everything)."""
+    if not os.path.isdir(cube_dir()):
+        return pd.DataFrame(columns=KEY_COLUMNS)
+
+    dataset = ds.dataset(cube_dir(), format='parquet', partitioning='hive')
+    condition = None
+    for field, values in (('season', seasons), ('Event', events), ('Session', sessions),
+                          ('Driver', drivers)):
+        if values is not None:
+            part = _isin(field, values)
+            condition = part if condition is None else condition & part
+
+    wanted = None
+    if columns is not None:
+        wanted = list(dict.fromkeys(KEY_COLUMNS + list(columns)))
+    table = dataset.to_table(columns=wanted or [f for f in dataset.schema.names
+                                                if f not in ('season', 'event', 'session')],
+                             filter=condition)
+    cube = table.to_pandas()
+    for column in CATEGORY_COLUMNS:
+        if column in cube.columns:
+            cube[column] = cube[column].astype('category')
+    return cube.sort_values(KEY_COLUMNS).reset_index(drop=True)
+
+
+def stored_sessions():
+    cube = query(columns=[])
+    return list(cube[['Season', 'Event', 'Session']].drop_duplicates().itertuples(index=False, name=None))
+
+
+def main(argv=None):
+    import session_loader
+
+    parser = argparse.ArgumentParser(description="Add sessions to the season aggregate cube.")
+    parser.add_argument('year', type=int)
+    parser.add_argument('race')
+    parser.add_argument('--sessions', nargs='+', default=['R'])
+    parser.add_argument('--force', action='store_true')
+    args = parser.parse_args(argv)
+
+    for session_type in args.sessions:
+        session = session_loader.load(args.year, args.race, session_type, session_loader.requirements('stints'))
+        added = add_session(session, args.year, args.race, session_type, force=args.force)
+        print(f"{args.year} {args.race} {session_type}: {'added' if added else 'already present'}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
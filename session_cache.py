@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Loaded sessions are shared by every script run of the server process. The
+# budget bounds the summed in-memory size of all cached sessions; the least
+# recently used sessions are dropped first once it is exceeded.
+DEFAULT_MAX_BYTES = int(os.environ.get('F1_SESSION_CACHE_BYTES', 2 * 1024 ** 3))
+
+FRAME_ATTRS = ('_laps', '_results', '_weather_data', '_track_status',
+               '_session_status', '_race_control_messages')
+TELEMETRY_ATTRS = ('_car_data', '_pos_data')
+
+
+def session_nbytes(session):
+    total = 0
+    for attr in FRAME_ATTRS:
+        df = getattr(session, attr, None)
+        if df is not None:
+            total += int(df.memory_usage(index=True, deep=True).sum())
+    for attr in TELEMETRY_ATTRS:
+        for df in (getattr(session, attr, None) or {}).values():
+            total += int(df.memory_usage(index=True, deep=True).sum())
+    return total
+
+
+class SessionCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, sizeof=session_nbytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def get_or_load(self, key, loader):
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                pending = self._loading.get(key)
+                if pending is None:
+                    self.misses += 1
+                    pending = self._loading[key] = threading.Event()
+                    break
+            # another script run is already loading this session; wait for it
+            # and look again (retrying the load if it failed)
+            pending.wait()
+
+        try:
+            value = loader()
+            if value is not None:
+                self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._loading[key]
+            pending.set()
+
+    def put(self, key, value):
+        nbytes = self.sizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            if nbytes > self.max_bytes:
+                return False
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            self._evict()
+        return True
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.current_bytes -= nbytes
+            self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.current_bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+sessions = SessionCache()
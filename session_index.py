@@ -0,0 +1,186 @@
+import json
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+
+import replay_server
+import session_store
+
+replay_server.install()
+
+# Persisted record of which (year, event, session) triples have data, so the
+# default circuit/session can be picked without calling Session.load() on
+# every event of the season.
+CACHE_DIR = 'cache'
+INDEX_PATH = os.path.join(CACHE_DIR, 'session_index.json')
+
+# Negative entries expire so that sessions which were unavailable (or had not
+# happened yet) are picked up again later. Positive entries only expire when
+# they were inferred from the schedule rather than seen on disk.
+NEGATIVE_TTL = 6 * 60 * 60
+SCHEDULE_TTL = 24 * 60 * 60
+
+SESSION_ORDER = ['R', 'Q', 'S', 'FP3', 'FP2', 'FP1']
+SESSION_NAMES = {
+    'R': 'Race',
+    'Q': 'Qualifying',
+    'S': 'Sprint',
+    'FP3': 'Practice 3',
+    'FP2': 'Practice 2',
+    'FP1': 'Practice 1'
+}
+SESSION_TYPES = {name: code for code, name in SESSION_NAMES.items()}
+
+# a session is considered present in the fastf1 cache once its timing data is
+TIMING_FILES = ('_extended_timing_data.ff1pkl', 'timing_app_data.ff1pkl')
+
+_lock = threading.Lock()
+_entries = None
+_schedules = {}
+
+
+def _key(year, race, session_type):
+    return f"{year}|{race}|{session_type}"
+
+
+def _load():
+    global _entries
+    if _entries is None:
+        try:
+            with open(INDEX_PATH) as f:
+                _entries = json.load(f)
+        except (OSError, ValueError):
+            _entries = {}
+    return _entries
+
+
+def _save():
+    os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
+    with open(INDEX_PATH + '.tmp', 'w') as f:
+        json.dump(_entries, f, indent=1, sort_keys=True)
+    os.replace(INDEX_PATH + '.tmp', INDEX_PATH)
+
+
+def _fresh(entry, now):
+    return entry['expires'] is None or entry['expires'] > now
+
+
+def _set(entries, year, race, session_type, available, ttl, source, now):
+    entries[_key(year, race, session_type)] = {
+        'available': available,
+        'expires': None if ttl is None else now + ttl,
+        'source': source,
+    }
+
+
+def _strip_date(name):
+    return re.sub(r'^\d{4}-\d{2}-\d{2}_', '', name).replace('_', ' ')
+
+
+def scan_cache(year):
+    import cache_manager
+
+    found = []
+    year_dir = os.path.join(CACHE_DIR, str(year))
+    if not os.path.isdir(year_dir):
+        return found
+    for event_dir in sorted(os.listdir(year_dir)):
+        event_path = os.path.join(year_dir, event_dir)
+        if not os.path.isdir(event_path):
+            continue
+        for session_dir in os.listdir(event_path):
+            session_type = SESSION_TYPES.get(_strip_date(session_dir))
+            files = [cache_manager.logical_name(f) for f in os.listdir(os.path.join(event_path, session_dir))]
+            if session_type and any(f in files for f in TIMING_FILES):
+                found.append((_strip_date(event_dir), session_type))
+    return found
+
+
+def lookup(year, race, session_type):
+    with _lock:
+        entry = _load().get(_key(year, race, session_type))
+        if entry is None or not _fresh(entry, time.time()):
+            return None
+        return entry['available']
+
+
+def mark(year, race, session_type, available, ttl=None, source='load'):
+    if not available and ttl is None:
+        ttl = NEGATIVE_TTL
+    with _lock:
+        entries = _load()
+        entry = entries.get(_key(year, race, session_type))
+        if entry is not None and entry['available'] == available and entry['expires'] is None:
+            return
+        _set(entries, year, race, session_type, available, ttl, source, time.time())
+        _save()
+
+
+def refresh(year, schedule):
+    now = time.time()
+    utc_now = pd.Timestamp.utcnow().tz_localize(None)
+
+    with _lock:
+        entries = _load()
+        before = dict(entries)
+
+        for race, session_type in scan_cache(year):
+            _set(entries, year, race, session_type, True, None, 'cache', now)
+
+        for _, event in schedule.iterrows():
+            race = event['EventName']
+            for i in range(1, 6):
+                session_type = SESSION_TYPES.get(event.get(f'Session{i}'))
+                if session_type is None:
+                    continue
+                entry = entries.get(_key(year, race, session_type))
+                if entry is not None and _fresh(entry, now):
+                    continue
+
+                if session_store.has_session(year, race, session_type):
+                    _set(entries, year, race, session_type, True, None, 'store', now)
+                    continue
+
+                date = event.get(f'Session{i}DateUtc')
+                if pd.isna(date) or not event.get('F1ApiSupport', True):
+                    _set(entries, year, race, session_type, False, NEGATIVE_TTL, 'schedule', now)
+                elif pd.Timestamp(date) > utc_now:
+                    # not run yet; look again once it has taken place
+                    ttl = (pd.Timestamp(date) - utc_now).total_seconds()
+                    _set(entries, year, race, session_type, False, ttl, 'schedule', now)
+                else:
+                    _set(entries, year, race, session_type, True, SCHEDULE_TTL, 'schedule', now)
+
+        if entries != before:
+            _save()
+
+
+def get_schedule(year):
+    now = time.time()
+    with _lock:
+        cached = _schedules.get(year)
+        if cached is not None and now - cached[0] < SCHEDULE_TTL:
+            return cached[1]
+
+    import fastf1
+    events = fastf1.get_event_schedule(year)
+    with _lock:
+        _schedules[year] = (now, events)
+    return events
+
+
+def latest_session_type(year, race):
+    for session_type in SESSION_ORDER:
+        if lookup(year, race, session_type):
+            return session_type
+    return None
+
+
+def first_available_race(year, races):
+    for idx, race in enumerate(races):
+        if latest_session_type(year, race) is not None:
+            return idx
+    return 0
@@ -0,0 +1,137 @@
+import threading
+import weakref
+
+import fastf1
+
+import cache_manager
+import compact
+import replay_server
+import season_cube
+import session_cache
+import session_store
+import shared_telemetry
+import telemetry
+
+# fastf1 requests go to the local replay server when F1_REPLAY_URL is set
+replay_server.install()
+
+# Data a session can be loaded with. Track status and session status always
+# come with 'laps', as fastf1 loads them together.
+PARTS = ('laps', 'telemetry', 'weather', 'messages')
+
+# Data needed by each analysis view of app.py and main.py.
+VIEWS = {
+    'competitors': {'laps'},
+    'basic': {'laps'},
+    'sectors': {'laps'},
+    'telemetry': {'laps', 'telemetry'},
+    'race_pace': {'laps'},
+    'stints': {'laps'},
+    'battles': {'laps'},
+}
+
+_locks = weakref.WeakKeyDictionary()
+_locks_lock = threading.Lock()
+
+
+def requirements(*views):
+    parts = {'laps'}
+    for view in views:
+        parts |= VIEWS[view]
+    return parts
+
+
+def loaded_parts(session):
+    parts = session_store.session_parts(session)
+    if telemetry.shared_field(session):
+        parts.add('telemetry')
+    return parts
+
+
+def load(year, race, session_type, parts):
+    parts = set(parts) | {'laps'}
+    # with shared telemetry, the car and position data are only loaded if some
+    # driver's telemetry has not been published yet
+    deferred = parts & {'telemetry'} if shared_telemetry.ENABLED else set()
+    session = session_store.load_session(year, race, session_type, parts=parts - deferred)
+    if session is not None:
+        cache_manager.manager.record(year, race, session_type)
+    else:
+        session = fastf1.get_session(year, race, session_type)
+        cached = cache_manager.manager.prepare(year, race, session_type)
+        session.load(laps=True, telemetry='telemetry' in parts - deferred,
+                     weather='weather' in parts, messages='messages' in parts)
+        if cached is None:
+            cache_manager.manager.record(year, race, session_type)
+        session_store.save_session(session, year, race, session_type)
+        cache_manager.manager.maintain_in_background()
+    if deferred:
+        _add_parts(session, year, race, session_type, deferred)
+
+    season_cube.update(session, year, race, session_type)
+    return session
+
+
+def _add_parts(session, year, race, session_type, missing):
+    if 'telemetry' in missing and telemetry.attach_field(session):
+        missing = missing - {'telemetry'}
+
+    missing = missing - session_store.fill_session(session, year, race, session_type, missing)
+
+    if missing:
+        cache_manager.manager.prepare(year, race, session_type)
+
+    # these are the steps Session.load() runs for each part
+    if 'telemetry' in missing:
+        session._load_telemetry()
+    if 'weather' in missing:
+        session._load_weather_data()
+    if 'messages' in missing:
+        session._load_race_control_messages()
+        session._set_laps_deleted_from_rcm()
+
+    if missing:
+        session_store.save_session(session, year, race, session_type)
+
+
+def _session_lock(session):
+    with _locks_lock:
+        lock = _locks.get(session)
+        if lock is None:
+            lock = _locks[session] = threading.Lock()
+        return lock
+
+
+def upgrade(session, year, race, session_type, parts):
+    """Add the missing ``parts`` to an already loaded session in place.
+
+    Returns True if anything had to be loaded.
+    """
+    if set(parts) <= loaded_parts(session):
+        return False
+
+    # sessions are shared between script runs, so only one of them upgrades
+    with _session_lock(session):
+        missing = set(parts) - loaded_parts(session)
+        if not missing:
+            return False
+
+        _add_parts(session, year, race, session_type, missing)
+        compact.compact(session, year, race, session_type)
+        return True
+
+
+def load_compact(year, race, session_type, parts):
+    session = load(year, race, session_type, parts)
+    compact.compact(session, year, race, session_type)
+    return session
+
+
+def get_session(year, race, session_type, parts=('laps', 'telemetry')):
+    key = (year, race, session_type)
+    session = session_cache.sessions.get_or_load(
+        key, lambda: load_compact(year, race, session_type, parts))
+    if upgrade(session, year, race, session_type, parts):
+        # re-measure the entry now that it holds more data
+        session_cache.sessions.put(key, session)
+    return session
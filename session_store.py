@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastf1.core import Laps, Session, SessionResults, Telemetry
+from fastf1.events import Event
+
+_logger = logging.getLogger(__name__)
+
+# Columnar copy of every finished session that has been loaded once. Each
+# session gets its own directory with one Parquet file per table, so a cold
+# start only reads the columns it needs instead of re-running Session.load().
+STORE_DIR = 'store'
+STORE_VERSION = 2
+
+# Sessions are only persisted once they can no longer change upstream.
+FINAL_AFTER = pd.Timedelta(hours=6)
+
+# Tables held by each loadable part of a session. 'laps' also always brings
+# the event and results tables.
+PART_TABLES = {
+    'laps': ('track_status', 'session_status'),
+    'telemetry': ('car_data', 'pos_data'),
+    'weather': ('weather',),
+    'messages': ('race_control',),
+}
+LAP_TABLES = PART_TABLES['laps']
+TELEMETRY_TABLES = PART_TABLES['telemetry']
+
+TABLE_ATTRS = {
+    'car_data': '_car_data',
+    'pos_data': '_pos_data',
+    'weather': '_weather_data',
+    'track_status': '_track_status',
+    'session_status': '_session_status',
+    'race_control': '_race_control_messages',
+}
+PART_ATTRS = {
+    'laps': '_laps',
+    'telemetry': '_car_data',
+    'weather': '_weather_data',
+    'messages': '_race_control_messages',
+}
+
+# Always kept when laps are read with a column projection so that the result
+# still supports pick_drivers(), pick_laps() and get_telemetry().
+LAP_KEY_COLUMNS = ('Driver', 'DriverNumber', 'Team', 'LapNumber', 'LapStartTime', 'Time')
+
+
+def session_dir(year, race, session_type):
+    return os.path.join(STORE_DIR, str(year), str(race).replace(' ', '_'), session_type)
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != STORE_VERSION:
+        return None
+    return meta
+
+
+def _replace(target, write, mode='wb'):
+    # a temporary file of its own, as several processes may store the same
+    # session at once
+    fd, path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(target))
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(path, target)
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+def _write_table(path, name, df):
+    table = pa.Table.from_pandas(pd.DataFrame(df), preserve_index=False)
+    _replace(os.path.join(path, f"{name}.parquet"), lambda f: pq.write_table(table, f))
+
+
+def read_table(path, name, columns=None):
+    target = os.path.join(path, f"{name}.parquet")
+    if columns is not None:
+        available = pq.read_schema(target, memory_map=True).names
+        columns = [c for c in columns if c in available]
+    return pq.read_table(target, columns=columns, memory_map=True).to_pandas()
+
+
+def _lap_columns(columns):
+    if columns is None:
+        return None
+    return list(LAP_KEY_COLUMNS) + [c for c in columns if c not in LAP_KEY_COLUMNS]
+
+
+def _stack_telemetry(telemetry):
+    frames = []
+    for driver, data in telemetry.items():
+        frame = pd.DataFrame(data)
+        frame['DriverNumber'] = driver
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def _unstack_telemetry(df, session):
+    telemetry = {}
+    for driver, data in df.groupby('DriverNumber', sort=False):
+        telemetry[driver] = Telemetry(data.drop(columns='DriverNumber').reset_index(drop=True),
+                                      session=session, driver=driver)
+    return telemetry
+
+
+def _stamp(value):
+    if value is None or pd.isna(value):
+        return None
+    return str(value)
+
+
+def is_final(session):
+    date = pd.Timestamp(session.date)
+    if date.tzinfo is not None:
+        date = date.tz_convert('UTC').tz_localize(None)
+    return pd.Timestamp.utcnow().tz_localize(None) - date > FINAL_AFTER
+
+
+def stored_parts(year, race, session_type):
+    meta = _read_meta(session_dir(year, race, session_type))
+    return set(meta['parts']) if meta is not None else set()
+
+
+def has_session(year, race, session_type, parts=('laps',)):
+    return set(parts) <= stored_parts(year, race, session_type)
+
+
+def session_parts(session):
+    return {part for part, attr in PART_ATTRS.items() if hasattr(session, attr)}
+
+
+def save_session(session, year, race, session_type):
+    if not is_final(session):
+        return False
+
+    path = session_dir(year, race, session_type)
+    meta = _read_meta(path)
+    stored = set(meta['tables']) if meta is not None else set()
+
+    tables = {
+        'event': pd.DataFrame([session.event]),
+        'laps': session.laps,
+        'results': session.results,
+    }
+    for name, attr in TABLE_ATTRS.items():
+        data = getattr(session, attr, None)
+        if data is None:
+            continue
+        if isinstance(data, dict):
+            # telemetry never changes once stored, so it is only written once
+            if name in stored:
+                continue
+            data = _stack_telemetry(data)
+        if len(data):
+            tables[name] = data
+
+    os.makedirs(path, exist_ok=True)
+    try:
+        for name, df in tables.items():
+            _write_table(path, name, df)
+    except (pa.ArrowException, ValueError, TypeError) as e:
+        _logger.warning(f"Could not store {year} {race} {session_type}: {e}")
+        return False
+
+    parts = session_parts(session) | (set(meta['parts']) if meta is not None else set())
+    meta = {
+        'version': STORE_VERSION,
+        'name': session.name,
+        'parts': sorted(parts),
+        'tables': sorted(stored | set(tables)),
+        't0_date': _stamp(getattr(session, '_t0_date', None)) or (meta or {}).get('t0_date'),
+        'session_start_time': _stamp(getattr(session, '_session_start_time', None)),
+        'total_laps': getattr(session, '_total_laps', None),
+    }
+    _replace(os.path.join(path, 'meta.json'), lambda f: json.dump(meta, f), mode='w')
+    return True
+
+
+def load_laps(year, race, session_type, columns=None, session=None):
+    path = session_dir(year, race, session_type)
+    if _read_meta(path) is None:
+        return None
+    return Laps(read_table(path, 'laps', _lap_columns(columns)), session=session)
+
+
+def _fill(session, path, meta, parts):
+    filled = set()
+    for part in parts:
+        if part not in meta['parts'] or part == 'laps':
+            continue
+        for name in PART_TABLES[part]:
+            attr = TABLE_ATTRS[name]
+            if name not in meta['tables']:
+                # loaded upstream, but there was no data for it
+                setattr(session, attr, {} if name in TELEMETRY_TABLES else pd.DataFrame())
+            elif name in TELEMETRY_TABLES:
+                setattr(session, attr, _unstack_telemetry(read_table(path, name), session))
+            else:
+                setattr(session, attr, read_table(path, name))
+        if part == 'telemetry':
+            session._t0_date = pd.Timestamp(meta['t0_date']) if meta['t0_date'] else None
+        filled.add(part)
+    return filled
+
+
+def fill_session(session, year, race, session_type, parts):
+    path = session_dir(year, race, session_type)
+    meta = _read_meta(path)
+    if meta is None:
+        return set()
+    return _fill(session, path, meta, parts)
+
+
+def load_session(year, race, session_type, parts=('laps', 'telemetry'), lap_columns=None):
+    path = session_dir(year, race, session_type)
+    meta = _read_meta(path)
+    if meta is None or not set(parts) <= set(meta['parts']):
+        return None
+
+    event = Event(read_table(path, 'event').iloc[0], year=year)
+    session = Session(event, meta['name'], f1_api_support=True)
+    session._results = SessionResults(read_table(path, 'results'))
+    session._laps = Laps(read_table(path, 'laps', _lap_columns(lap_columns)), session=session)
+    session._total_laps = meta['total_laps']
+    session._session_start_time = (pd.Timedelta(meta['session_start_time'])
+                                   if meta['session_start_time'] else None)
+    for name in LAP_TABLES:
+        if name in meta['tables']:
+            setattr(session, TABLE_ATTRS[name], read_table(path, name))
+
+    _fill(session, path, meta, parts)
+    return session
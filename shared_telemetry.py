@@ -0,0 +1,300 @@
+import argparse
+import inspect
+import json
+import logging
+import os
+import shutil
+import threading
+import weakref
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_logger = logging.getLogger(__name__)
+
+# Extracted lap telemetry (see telemetry.LapTelemetry) can be published once
+# into shared memory, one block per driver, and attached read-only by every
+# other process that opens the same session: Streamlit servers, worker
+# service workers, batch runs. A catalogue next to the fastf1 cache records
+# the blocks and which processes read each session; the blocks are unlinked
+# when the last reader releases the session or is found dead. Off by default,
+# as shared memory is often small in containers; needs fcntl (not Windows).
+ENABLED = os.environ.get('F1_SHARED_TELEMETRY', '0') == '1' and fcntl is not None
+CATALOGUE_DIR = os.environ.get('F1_SHARED_DIR', os.path.join('cache', 'shared'))
+CATALOGUE_PATH = os.path.join(CATALOGUE_DIR, 'catalogue.json')
+LOCK_PATH = os.path.join(CATALOGUE_DIR, 'catalogue.lock')
+
+# Shared memory left free when publishing; a block that would go below it is
+# not published and the process keeps its own copy.
+RESERVE_BYTES = int(os.environ.get('F1_SHARED_RESERVE_BYTES', 256 * 1024 ** 2))
+
+# SharedMemory takes track=False from Python 3.13 on
+_TRACK_ARGUMENT = 'track' in inspect.signature(shared_memory.SharedMemory).parameters
+
+_thread_lock = threading.Lock()
+# session -> catalogue key, for sessions this process reads
+_sessions = weakref.WeakKeyDictionary()
+# catalogue key -> number of session objects of this process reading it
+_local_readers = {}
+# catalogue key -> {block name: SharedMemory} mapped by this process
+_mapped = {}
+# blocks still referenced by arrays when their session was released
+_lingering = []
+# catalogue keys of session objects collected since the last call; the
+# finalizer only queues them, as the garbage collector can run it on a thread
+# that holds the catalogue lock
+_released = []
+
+
+class _CatalogueLock:
+    """The catalogue, read and written under an exclusive file lock."""
+
+    def __enter__(self):
+        _thread_lock.acquire()
+        os.makedirs(CATALOGUE_DIR, exist_ok=True)
+        self._file = open(LOCK_PATH, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            with open(CATALOGUE_PATH) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+        return self
+
+    def save(self):
+        tmp = CATALOGUE_PATH + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, CATALOGUE_PATH)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        _thread_lock.release()
+
+
+def _open(name, create=False, size=0):
+    # blocks outlive the process that created them, so keep them away from
+    # the resource tracker, which unlinks everything a process touched on exit
+    if _TRACK_ARGUMENT:
+        return shared_memory.SharedMemory(name, create=create, size=size, track=False)
+    shm = shared_memory.SharedMemory(name, create=create, size=size)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _destroy(shm):
+    if not _TRACK_ARGUMENT:
+        # unlink() unregisters the block from the tracker a second time
+        resource_tracker.register(shm._name, 'shared_memory')
+    shm.close()
+    shm.unlink()
+
+
+def _unlink(name):
+    try:
+        _destroy(_open(name))
+    except FileNotFoundError:
+        pass
+
+
+def _alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _prune(catalogue):
+    """Drop readers that died and unlink sessions nobody reads any more."""
+    changed = False
+    for key, entry in list(catalogue.entries.items()):
+        readers = {pid: n for pid, n in entry['readers'].items() if n > 0 and _alive(pid)}
+        if readers != entry['readers']:
+            entry['readers'] = readers
+            changed = True
+        if not readers:
+            for block in entry['blocks'].values():
+                _unlink(block['name'])
+            del catalogue.entries[key]
+            changed = True
+    return changed
+
+
+def session_key(session):
+    import session_index
+
+    session_type = session_index.SESSION_TYPES.get(session.name, session.name)
+    # live sessions are reloaded with more laps; their telemetry changes too
+    return f"{session.event.year}/{session.event['EventName']}/{session_type}/{len(session.laps)}"
+
+
+def _register(catalogue, session, key):
+    """Count this process as a reader of ``key`` once per session object."""
+    if session in _sessions:
+        return
+    _sessions[session] = key
+    pid = str(os.getpid())
+    entry = catalogue.entries.setdefault(key, {'blocks': {}, 'readers': {}})
+    entry['readers'][pid] = entry['readers'].get(pid, 0) + 1
+    _local_readers[key] = _local_readers.get(key, 0) + 1
+    weakref.finalize(session, _released.append, key)
+
+
+def _release_collected():
+    while _released:
+        release(_released.pop())
+
+
+def _view(key, block):
+    from telemetry import LAP_CHANNELS, LapTelemetry
+
+    shm = _mapped.setdefault(key, {}).get(block['name'])
+    if shm is None:
+        shm = _open(block['name'])
+        _mapped[key][block['name']] = shm
+    rows, laps = block['rows'], block['laps']
+    values = np.ndarray((rows + laps, len(LAP_CHANNELS)), dtype='float64', buffer=shm.buf)
+    values.flags.writeable = False
+    lap_table = values[rows:, :3]
+    return LapTelemetry(values[:rows], lap_table[:, 0], lap_table[:, 1:].astype('int64'))
+
+
+def attach(session, driver):
+    """Shared telemetry of ``driver`` as a read-only LapTelemetry, or None."""
+    if not ENABLED:
+        return None
+    _release_collected()
+    key = session_key(session)
+    with _CatalogueLock() as catalogue:
+        block = catalogue.entries.get(key, {}).get('blocks', {}).get(str(driver))
+        if block is None:
+            return None
+        try:
+            extracted = _view(key, block)
+        except FileNotFoundError:
+            return None
+        _register(catalogue, session, key)
+        catalogue.save()
+    return extracted
+
+
+def _free_bytes():
+    try:
+        return shutil.disk_usage('/dev/shm').free
+    except OSError:
+        return None
+
+
+def publish(session, driver, extracted):
+    """Publish ``extracted`` for ``driver`` and return the shared copy.
+
+    Returns ``extracted`` itself when sharing is disabled or the block cannot
+    be created. When another process published the same driver first, its
+    block is used and this one discarded.
+    """
+    if not ENABLED:
+        return extracted
+    _release_collected()
+    key = session_key(session)
+    rows, width = extracted.data.shape
+    laps = len(extracted.lap_numbers)
+    size = (rows + laps) * width * 8
+    free = _free_bytes()
+    if free is not None and free - size < RESERVE_BYTES:
+        _logger.warning(f"Not sharing telemetry of {driver} in {key}: shared memory nearly full")
+        return extracted
+
+    try:
+        shm = _open(None, create=True, size=max(size, 1))
+    except OSError as e:
+        _logger.warning(f"Could not share telemetry of {driver} in {key}: {e}")
+        return extracted
+    values = np.ndarray((rows + laps, width), dtype='float64', buffer=shm.buf)
+    values[:rows] = extracted.data
+    values[rows:, 0] = extracted.lap_numbers
+    values[rows:, 1:3] = extracted.bounds
+    values[rows:, 3:] = np.nan
+    del values
+
+    block = {'name': shm.name, 'rows': rows, 'laps': laps}
+    with _CatalogueLock() as catalogue:
+        _prune(catalogue)
+        entry = catalogue.entries.setdefault(key, {'blocks': {}, 'readers': {}})
+        existing = entry['blocks'].get(str(driver))
+        if existing is None:
+            entry['blocks'][str(driver)] = block
+            _mapped.setdefault(key, {})[shm.name] = shm
+        else:
+            _destroy(shm)
+            block = existing
+        _register(catalogue, session, key)
+        shared = _view(key, block)
+        catalogue.save()
+    return shared
+
+
+def _close(shm):
+    try:
+        shm.close()
+        return True
+    except BufferError:
+        return False
+
+
+def release(key):
+    """Stop reading ``key`` from one session object of this process.
+
+    The blocks are unmapped here once no session object of this process reads
+    them, and unlinked once no process does.
+    """
+    with _CatalogueLock() as catalogue:
+        pid = str(os.getpid())
+        entry = catalogue.entries.get(key)
+        if entry is not None and pid in entry['readers']:
+            entry['readers'][pid] -= 1
+        _prune(catalogue)
+        catalogue.save()
+
+        _local_readers[key] = _local_readers.get(key, 1) - 1
+        if _local_readers[key] <= 0:
+            del _local_readers[key]
+            # arrays still handed out keep their block mapped until they go
+            _lingering.extend(_mapped.pop(key, {}).values())
+        _lingering[:] = [shm for shm in _lingering if not _close(shm)]
+
+
+def status():
+    """Published sessions with their readers and size in bytes."""
+    from telemetry import LAP_CHANNELS
+
+    if fcntl is None:
+        return {}
+    _release_collected()
+    with _CatalogueLock() as catalogue:
+        if _prune(catalogue):
+            catalogue.save()
+        return {key: {'readers': entry['readers'], 'drivers': len(entry['blocks']),
+                      'bytes': sum((b['rows'] + b['laps']) * len(LAP_CHANNELS) * 8
+                                   for b in entry['blocks'].values())}
+                for key, entry in catalogue.entries.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the telemetry published into shared memory, after "
+                                                 "releasing sessions whose readers have exited.")
+    parser.parse_args(argv)
+    print(json.dumps(status(), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
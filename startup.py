@@ -0,0 +1,160 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_logger = logging.getLogger(__name__)
+
+# What is warmed before the first visitor needs it. Sessions are given as
+# "year/Event Name/session type" separated by ";"; when none are configured,
+# the latest available session of every pre-warm year is loaded.
+PREWARM_YEARS = [int(y) for y in os.environ.get('F1_PREWARM_YEARS', '2024').split(',') if y]
+PREWARM_SESSIONS = os.environ.get('F1_PREWARM_SESSIONS', '')
+PREWARM_PARTS = ('laps', 'telemetry')
+
+# Port of the readiness endpoint (GET /ready, GET /status); 0 disables it.
+# It only listens on the local host unless F1_READY_HOST is set, e.g. to
+# 0.0.0.0 for container probes.
+READY_PORT = int(os.environ.get('F1_READY_PORT', '8599'))
+READY_HOST = os.environ.get('F1_READY_HOST', '127.0.0.1')
+
+_state = {
+    'stage': 'idle',
+    'ready': False,
+    'started': None,
+    'finished': None,
+    'schedules': [],
+    'sessions': [],
+    'errors': [],
+}
+_state_lock = threading.Lock()
+_started = False
+
+
+def _update(**values):
+    with _state_lock:
+        _state.update(values)
+
+
+def _append(name, value):
+    with _state_lock:
+        _state[name].append(value)
+
+
+def status():
+    with _state_lock:
+        return json.loads(json.dumps(_state))
+
+
+def configured_sessions():
+    sessions = []
+    for entry in PREWARM_SESSIONS.split(';'):
+        if entry.strip():
+            year, race, session_type = entry.strip().split('/')
+            sessions.append((int(year), race, session_type))
+    return sessions
+
+
+def prewarm(years=None, sessions=None, parts=PREWARM_PARTS):
+    years = PREWARM_YEARS if years is None else years
+    # the latest sessions are only picked when none were given or configured
+    pick_latest = sessions is None and not PREWARM_SESSIONS
+    sessions = configured_sessions() if sessions is None else list(sessions)
+    _update(stage='imports', started=time.time())
+
+    import fastf1
+    import session_index
+    import session_loader
+    fastf1.Cache.enable_cache('cache')
+
+    _update(stage='schedules')
+    for year in years:
+        try:
+            schedule = session_index.get_schedule(year)
+            session_index.refresh(year, schedule)
+            _append('schedules', year)
+        except Exception as e:
+            _append('errors', f"schedule {year}: {e}")
+            continue
+        if pick_latest:
+            races = schedule['EventName'].tolist()
+            race = races[session_index.first_available_race(year, races)]
+            session_type = session_index.latest_session_type(year, race)
+            if session_type is not None:
+                sessions.append((year, race, session_type))
+
+    _update(stage='sessions')
+    for year, race, session_type in sessions:
+        try:
+            session_loader.get_session(year, race, session_type, parts)
+            _append('sessions', f"{year}/{race}/{session_type}")
+        except Exception as e:
+            _append('errors', f"session {year}/{race}/{session_type}: {e}")
+
+    _update(stage='ready', ready=True, finished=time.time())
+    return status()
+
+
+class _ReadinessHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        state = status()
+        if self.path.startswith('/ready'):
+            code = 200 if state['ready'] else 503
+        elif self.path.startswith('/status'):
+            code = 200
+        else:
+            self.send_error(404)
+            return
+        body = json.dumps(state).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_readiness(port=READY_PORT, host=READY_HOST):
+    server = ThreadingHTTPServer((host, port), _ReadinessHandler)
+    threading.Thread(target=server.serve_forever, name='f1-readiness', daemon=True).start()
+    return server
+
+
+def start():
+    """Start the readiness endpoint and the background pre-warm, once per process."""
+    global _started
+    with _state_lock:
+        if _started:
+            return
+        _started = True
+
+    if READY_PORT:
+        try:
+            serve_readiness(READY_PORT)
+        except OSError as e:
+            _logger.warning(f"Readiness endpoint not started: {e}")
+    threading.Thread(target=prewarm, name='f1-prewarm', daemon=True).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm the session caches ahead of the first visitor.")
+    parser.add_argument('--years', nargs='*', type=int, default=None)
+    parser.add_argument('--session', action='append', default=None,
+                        help='"year/Event Name/session type", may be repeated')
+    args = parser.parse_args(argv)
+
+    sessions = None
+    if args.session:
+        sessions = [(int(y), r, t) for y, r, t in (s.split('/') for s in args.session)]
+    state = prewarm(args.years, sessions)
+    print(json.dumps(state, indent=2))
+    return 1 if state['errors'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
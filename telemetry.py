@@ -0,0 +1,251 @@
+import os
+import tempfile
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+import session_cache
+import session_index
+import session_store
+import shared_telemetry
+
+# Default number of points sent to the browser per telemetry trace.
+TRACE_POINTS = 400
+
+# Channels whose on/off state changes must survive decimation exactly. A
+# channel is "on" when its value is above the threshold.
+TRANSITION_THRESHOLDS = {'Brake': 0, 'Throttle': 0}
+
+
+def _bucket_extrema(values, n_buckets):
+    n_samples = values.shape[0]
+    bucket_size = -(-n_samples // n_buckets)
+    padded = np.pad(values, ((0, bucket_size * n_buckets - n_samples), (0, 0)), mode='edge')
+    buckets = padded.reshape(n_buckets, bucket_size, values.shape[1])
+
+    nan = np.isnan(buckets)
+    lows = np.where(nan, np.inf, buckets).argmin(axis=1)
+    highs = np.where(nan, -np.inf, buckets).argmax(axis=1)
+
+    offsets = (np.arange(n_buckets) * bucket_size)[:, None]
+    indices = np.concatenate((lows + offsets, highs + offsets))
+    return np.minimum(indices, n_samples - 1)
+
+
+def _transitions(values):
+    changes = np.flatnonzero(values[1:] != values[:-1])
+    return np.concatenate((changes, changes + 1))
+
+
+def decimate(telemetry, channels, n_points=TRACE_POINTS, x='Distance'):
+    """Reduce each channel of ``telemetry`` to about ``n_points`` samples.
+
+    Min/max bucketing is done for all channels in a single pass. The first and
+    last sample and both samples around every on/off change of the channels in
+    TRANSITION_THRESHOLDS are always kept. Returns ``{channel: (x, y)}``.
+    """
+    values = np.column_stack([telemetry[c].to_numpy(dtype='float64') for c in channels])
+    x_values = telemetry[x].to_numpy(dtype='float64')
+    n_samples = len(x_values)
+
+    if n_samples <= n_points:
+        return {c: (x_values, values[:, i]) for i, c in enumerate(channels)}
+
+    extrema = _bucket_extrema(values, max(1, n_points // 2))
+    edges = np.array([0, n_samples - 1])
+
+    traces = {}
+    for i, channel in enumerate(channels):
+        keep = [extrema[:, i], edges]
+        if channel in TRANSITION_THRESHOLDS:
+            keep.append(_transitions(values[:, i] > TRANSITION_THRESHOLDS[channel]))
+        idx = np.unique(np.concatenate(keep))
+        traces[channel] = (x_values[idx], values[idx, i])
+    return traces
+
+
+# Numeric channels kept by the bulk lap extractor, in column order. SessionTime
+# is stored in seconds.
+LAP_CHANNELS = ['SessionTime', 'Distance', 'Speed', 'RPM', 'nGear', 'Throttle',
+                'Brake', 'DRS', 'X', 'Y', 'Z']
+
+_extracted = weakref.WeakKeyDictionary()
+_extract_lock = threading.Lock()
+# session -> drivers whose entry in _extracted is read from shared memory
+_shared_drivers = weakref.WeakKeyDictionary()
+# session -> extract_driver() calls in progress, which still need the car and
+# position data
+_extracting = weakref.WeakKeyDictionary()
+
+
+def _save_temporary(directory, array):
+    # a file of its own, as several threads may save the same driver at once
+    fd, path = tempfile.mkstemp(suffix='.tmp.npy', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+class LapTelemetry:
+    """Merged telemetry of all laps of one driver in one contiguous array.
+
+    ``data`` holds one row per sample and one column per LAP_CHANNELS entry;
+    ``bounds`` holds the [start, stop) rows of every lap in ``lap_numbers``.
+    Distance restarts at zero on every lap, so a lap is a plain row slice.
+    """
+
+    def __init__(self, data, lap_numbers, bounds):
+        self.data = data
+        self.lap_numbers = lap_numbers
+        self.bounds = bounds
+        self._rows = {int(n): i for i, n in enumerate(lap_numbers)}
+
+    def __contains__(self, lap_number):
+        return int(lap_number) in self._rows
+
+    def samples(self, lap_number):
+        start, stop = self.bounds[self._rows[int(lap_number)]]
+        return self.data[start:stop]
+
+    def lap(self, lap_number):
+        return pd.DataFrame(self.samples(lap_number), columns=LAP_CHANNELS, copy=False)
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        data = _save_temporary(directory, np.asarray(self.data))
+        laps = _save_temporary(directory, np.column_stack((self.lap_numbers, self.bounds)))
+        os.replace(laps, path + '_laps.npy')
+        os.replace(data, path + '.npy')
+
+    @classmethod
+    def open(cls, path):
+        try:
+            data = np.load(path + '.npy', mmap_mode='r')
+            laps = np.load(path + '_laps.npy')
+        except (OSError, ValueError):
+            return None
+        return cls(data, laps[:, 0], laps[:, 1:].astype('int64'))
+
+
+def _channel(merged, column):
+    if column not in merged.columns:
+        return np.full(len(merged), np.nan)
+    if column == 'SessionTime':
+        return merged[column].dt.total_seconds().to_numpy()
+    return merged[column].to_numpy(dtype='float64')
+
+
+def extract_driver(laps):
+    laps = laps[laps['LapStartTime'].notna() & laps['Time'].notna()].sort_values('LapNumber')
+    merged = laps.get_telemetry()
+    data = np.column_stack([_channel(merged, c) for c in LAP_CHANNELS])
+
+    session_time = data[:, 0]
+    starts = np.searchsorted(session_time, laps['LapStartTime'].dt.total_seconds().to_numpy())
+    stops = np.searchsorted(session_time, laps['Time'].dt.total_seconds().to_numpy())
+    stops = np.maximum(starts, stops)
+
+    distance = LAP_CHANNELS.index('Distance')
+    for start, stop in zip(starts, stops):
+        if stop > start:
+            data[start:stop, distance] -= data[start, distance]
+
+    return LapTelemetry(data, laps['LapNumber'].to_numpy(dtype='float64'),
+                        np.column_stack((starts, stops)))
+
+
+def _telemetry_path(session, driver):
+    session_type = session_index.SESSION_TYPES.get(session.name, session.name)
+    path = session_store.session_dir(session.event.year, session.event['EventName'], session_type)
+    return os.path.join(path, 'telemetry', str(driver))
+
+
+def shared_field(session):
+    """True when the telemetry of every driver of ``session`` is read from
+    shared memory, so its car and position data are not needed here."""
+    shared = _shared_drivers.get(session)
+    return bool(shared) and set(pd.unique(session.laps['Driver'])) <= shared
+
+
+def _add_shared(session, drivers):
+    with _extract_lock:
+        _shared_drivers.setdefault(session, set()).update(drivers)
+        if _extracting.get(session) or not shared_field(session):
+            return
+        # the car and position data are only read by extract_driver()
+        for attr in session_cache.TELEMETRY_ATTRS:
+            if hasattr(session, attr):
+                delattr(session, attr)
+
+
+def _extract(session, driver):
+    with _extract_lock:
+        _extracting[session] = _extracting.get(session, 0) + 1
+    try:
+        return extract_driver(session.laps.pick_drivers(driver))
+    finally:
+        with _extract_lock:
+            _extracting[session] -= 1
+
+
+def driver_telemetry(session, driver):
+    with _extract_lock:
+        by_driver = _extracted.setdefault(session, {})
+    extracted = by_driver.get(driver)
+    if extracted is not None:
+        return extracted
+
+    # published by another process, or extracted here and published
+    extracted = shared_telemetry.attach(session, driver)
+    shared = extracted is not None
+    if extracted is None:
+        path = _telemetry_path(session, driver)
+        extracted = LapTelemetry.open(path)
+        if extracted is None:
+            extracted = _extract(session, driver)
+            if session_store.is_final(session):
+                extracted.save(path)
+        published = shared_telemetry.publish(session, driver, extracted)
+        shared = published is not extracted
+        extracted = published
+    by_driver[driver] = extracted
+    if shared:
+        _add_shared(session, [driver])
+    return extracted
+
+
+def attach_field(session):
+    """Attach the shared telemetry of every driver of ``session``.
+
+    Returns True when all of it has been published by some process, in which
+    case the session's car and position data need not be loaded.
+    """
+    if not shared_telemetry.ENABLED:
+        return False
+    attached = {}
+    for driver in pd.unique(session.laps['Driver']):
+        extracted = shared_telemetry.attach(session, driver)
+        if extracted is None:
+            break
+        attached[driver] = extracted
+    with _extract_lock:
+        _extracted.setdefault(session, {}).update(attached)
+    _add_shared(session, attached)
+    return shared_field(session)
+
+
+def field_telemetry(session):
+    return {driver: driver_telemetry(session, driver)
+            for driver in pd.unique(session.laps['Driver'])}
+
+
+def lap_telemetry(laps_data, lap_number):
+    driver = laps_data['Driver'].iloc[0]
+    return driver_telemetry(laps_data.session, driver).lap(lap_number)
@@ -0,0 +1,468 @@
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import secrets
+import threading
+import zlib
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+
+import pandas as pd
+
+from analysis import analyze_sector_performance, battle_analysis, calculate_stint_statistics
+import charts
+import degradation
+import figure_cache
+import lap_index
+import pace
+import race_matrix
+import session_loader
+
+_logger = logging.getLogger(__name__)
+
+# Sessions can be loaded and analysed by a separate worker service instead of
+# the Streamlit server process. The service runs a pool of worker processes and
+# answers over a local socket: "host:port", or a filesystem path for a Unix
+# socket. When no address is set everything is computed in-process as before.
+ADDRESS = os.environ.get('F1_WORKER_ADDRESS', '')
+
+# Messages are pickled, so every connection must prove it knows the key:
+# F1_WORKER_AUTHKEY, or else a random key the service writes to AUTHKEY_FILE
+# (readable by its owner only) when it starts.
+AUTHKEY_FILE = os.environ.get('F1_WORKER_AUTHKEY_FILE', os.path.join('cache', 'worker_service.key'))
+WORKERS = int(os.environ.get('F1_WORKERS', os.cpu_count() or 2))
+
+BACKLOG = 64
+
+# Seconds a client waits for one answer, loading included.
+TIMEOUT = float(os.environ.get('F1_WORKER_TIMEOUT', '600'))
+
+
+class WorkerError(Exception):
+    pass
+
+
+def authkey(create=False):
+    """The service key; ``create`` writes a new random one when there is none."""
+    key = os.environ.get('F1_WORKER_AUTHKEY')
+    if key:
+        return key.encode()
+    try:
+        with open(AUTHKEY_FILE, 'rb') as f:
+            key = f.read().strip()
+    except FileNotFoundError:
+        key = b''
+    if key:
+        return key
+    if not create:
+        raise FileNotFoundError(f"No worker service key: set F1_WORKER_AUTHKEY, or start the service "
+                                f"so that it writes {AUTHKEY_FILE}")
+    os.makedirs(os.path.dirname(AUTHKEY_FILE) or '.', exist_ok=True)
+    try:
+        fd = os.open(AUTHKEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return authkey()
+    key = secrets.token_hex(32).encode()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+# Analyses that can run in a worker. Each takes the loaded session first and
+# returns something plain (no fastf1 objects, which would drag the whole
+# session through the pipe). Figures are returned as plotly JSON.
+OPERATIONS = {}
+
+
+def operation(fn):
+    OPERATIONS[fn.__name__] = fn
+    return fn
+
+
+@operation
+def lap_count(session):
+    return len(session.laps)
+
+
+@operation
+def drivers(session):
+    return pd.unique(session.laps['Driver']).tolist()
+
+
+@operation
+def lap_range(session, driver):
+    lap_numbers = lap_index.for_session(session).driver(driver)['LapNumber']
+    return int(lap_numbers.min()), int(lap_numbers.max())
+
+
+@operation
+def sector_performance(session, driver):
+    return analyze_sector_performance(lap_index.for_session(session).driver(driver))
+
+
+@operation
+def stint_statistics(session, driver):
+    return calculate_stint_statistics(lap_index.for_session(session).driver(driver))
+
+
+@operation
+def degradation_tables(session, driver):
+    model = degradation.for_session(session)
+    return model.stints[model.stints['Driver'] == driver], model.compounds
+
+
+@operation
+def battle_summary(session, threshold):
+    return race_matrix.for_session(session).battle_summary(threshold)
+
+
+@operation
+def race_laps(session):
+    lap_numbers = race_matrix.for_session(session).lap_numbers
+    return int(lap_numbers.min()), int(lap_numbers.max())
+
+
+@operation
+def running_order(session, lap_number):
+    return race_matrix.for_session(session).running_order(lap_number)
+
+
+FIGURES = {
+    'lap_times': lambda session, driver: charts.driver_lap_times(
+        lap_index.for_session(session).driver(driver), driver),
+    'speeds': lambda session, driver: charts.driver_speeds(lap_index.for_session(session).driver(driver)),
+    'positions': lambda session, driver: charts.driver_positions(lap_index.for_session(session).driver(driver)),
+    'degradation': lambda session, driver: charts.tyre_degradation(degradation.for_session(session), driver),
+    'speed_trace': lambda session, driver, lap_number: charts.speed_trace(
+        lap_index.for_session(session).driver(driver), lap_number),
+    'battle_gap': lambda session, driver1, driver2: charts.battle(
+        battle_analysis(session, driver1, driver2), 'Gap', f"Gap {driver1} to {driver2} (s)"),
+    'battle_time_diff': lambda session, driver1, driver2: charts.battle(
+        battle_analysis(session, driver1, driver2), 'TimeDiff'),
+    'pace': lambda session, drivers, metric: charts.pace_evolution(pace.for_session(session), list(drivers), metric),
+    'gap_to_leader': lambda session, drivers: charts.gap_to_leader(race_matrix.for_session(session), list(drivers)),
+    'fuel_effect': lambda session, drivers: charts.fuel_effect(pace.for_session(session), list(drivers)),
+}
+
+
+@operation
+def figure(session, name, *args):
+    fig = FIGURES[name](session, *args)
+    return None if fig is None else figure_cache.webgl(fig).to_json()
+
+
+class LocalSession:
+    """A session loaded in this process; analyses run directly."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def call(self, op, *args):
+        return OPERATIONS[op](self.session, *args)
+
+    def figure(self, name, *args):
+        return FIGURES[name](self.session, *args)
+
+
+class RemoteSession:
+    """A session owned by the worker service; analyses run in a worker."""
+
+    def __init__(self, client, year, race, session_type, parts):
+        self.client = client
+        self.key = (year, race, session_type)
+        self.parts = tuple(sorted(parts))
+
+    def call(self, op, *args):
+        return self.client.request(self.key, self.parts, op, args)
+
+    def figure(self, name, *args):
+        import plotly.graph_objects as go
+
+        spec = self.call('figure', name, *args)
+        if spec is None:
+            return None
+        return go.Figure(json.loads(spec), _validate=False)
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+class ServiceClient:
+    """Connection to the worker service, one socket per calling thread."""
+
+    def __init__(self, address=ADDRESS, key=None):
+        self.address = parse_address(address)
+        self.key = key
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self.key is None:
+                self.key = authkey()
+            conn = Client(self.address, authkey=self.key)
+            self._local.conn = conn
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def send(self, message):
+        # a connection left over from a restarted service fails on first use
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(message)
+                if not conn.poll(TIMEOUT):
+                    raise TimeoutError(f"No answer from the worker service in {TIMEOUT:.0f}s")
+                ok, result = conn.recv()
+                break
+            except (EOFError, ConnectionError):
+                self._drop()
+                if attempt:
+                    raise
+            except Exception:
+                self._drop()
+                raise
+        if not ok:
+            raise WorkerError(result)
+        return result
+
+    def request(self, key, parts, op, args=()):
+        return self.send(('call', key, tuple(parts), op, tuple(args)))
+
+    def stats(self):
+        return self.send(('stats',))
+
+
+_client = None
+
+
+def client():
+    global _client
+    if _client is None and ADDRESS:
+        _client = ServiceClient()
+    return _client
+
+
+def open_session(year, race, session_type, parts):
+    """The session as a LocalSession or RemoteSession, ready for analysis.
+
+    Goes through the worker service when one is configured, which also loads
+    the session there, and falls back to loading it in-process when the service
+    cannot be reached. Returns None when the session could not be loaded.
+    """
+    import streamlit as st
+
+    import session_index
+    from utils import load_session_data
+
+    service = client()
+    if service is not None:
+        remote = RemoteSession(service, year, race, session_type, parts)
+        try:
+            remote.call('lap_count')
+            session_index.mark(year, race, session_type, True)
+            return remote
+        except WorkerError as e:
+            session_index.mark(year, race, session_type, False)
+            st.error(f"Error loading session: {str(e)}")
+            return None
+        except (OSError, multiprocessing.AuthenticationError) as e:
+            _logger.warning(f"Worker service at {ADDRESS} unavailable, loading in-process: {e}")
+
+    session = load_session_data(year, race, session_type, parts)
+    return None if session is None else LocalSession(session)
+
+
+def _init_worker():
+    import fastf1
+
+    fastf1.Cache.enable_cache('cache')
+    fastf1.set_log_level('WARNING')
+
+
+def _worker(conn):
+    _init_worker()
+    while True:
+        try:
+            request_id, key, parts, op, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            session = session_loader.get_session(*key, parts)
+            answer = (True, OPERATIONS[op](session, *args))
+        except Exception as e:
+            answer = (False, f"{op} failed for {' '.join(map(str, key))}: {e}")
+        # answers are forwarded to the client as they are, without unpickling
+        conn.send((request_id, pickle.dumps(answer, protocol=pickle.HIGHEST_PROTOCOL)))
+
+
+class WorkerPool:
+    """Worker processes that load sessions and run OPERATIONS on them.
+
+    Every session is pinned to one worker by its key, so it is loaded and
+    held in memory by one process only. A request identical to one still in
+    flight shares its answer instead of being queued again.
+    """
+
+    def __init__(self, workers=WORKERS):
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending = {}
+        self._inflight = {}
+        self._workers = [None] * max(1, workers)
+        self._closed = False
+        self._stats = {'requests': 0, 'deduplicated': 0, 'lost': 0, 'restarts': 0}
+        for index in range(len(self._workers)):
+            self._start(index)
+
+    def _start(self, index):
+        conn, child = self._context.Pipe()
+        process = self._context.Process(target=_worker, args=(child,), name=f"f1-worker-{index}", daemon=True)
+        process.start()
+        child.close()
+        self._workers[index] = (process, conn, threading.Lock())
+        threading.Thread(target=self._collect, args=(index, conn), name=f"f1-worker-{index}-results",
+                         daemon=True).start()
+
+    def worker_for(self, key):
+        return zlib.crc32(repr(key).encode()) % len(self._workers)
+
+    def submit(self, key, parts, op, args):
+        """Future of the pickled ``(ok, result)`` answer to one request."""
+        request = (key, parts, op, args)
+        index = self.worker_for(key)
+        with self._lock:
+            self._stats['requests'] += 1
+            future = self._inflight.get(request)
+            if future is not None:
+                self._stats['deduplicated'] += 1
+                return future
+            future = Future()
+            request_id = next(self._ids)
+            self._inflight[request] = future
+            self._pending[request_id] = (index, request, future)
+            _, conn, send_lock = self._workers[index]
+        try:
+            with send_lock:
+                conn.send((request_id, key, parts, op, args))
+        except Exception as e:
+            self._finish(request_id, exception=e)
+        return future
+
+    def _finish(self, request_id, answer=None, exception=None):
+        with self._lock:
+            entry = self._pending.pop(request_id, None)
+            if entry is None:
+                return
+            self._inflight.pop(entry[1], None)
+            if exception is not None:
+                self._stats['lost'] += 1
+        if exception is not None:
+            entry[2].set_exception(exception)
+        else:
+            entry[2].set_result(answer)
+
+    def _collect(self, index, conn):
+        while True:
+            try:
+                request_id, answer = conn.recv()
+            except (EOFError, OSError):
+                break
+            self._finish(request_id, answer)
+
+        with self._lock:
+            lost = [request_id for request_id, entry in self._pending.items() if entry[0] == index]
+            self._stats['restarts'] += 1
+        for request_id in lost:
+            self._finish(request_id, exception=WorkerError(f"Worker {index} exited"))
+        if not self._closed:
+            _logger.warning(f"Worker {index} exited, {len(lost)} requests lost; restarting it")
+            self._start(index)
+
+    def close(self):
+        self._closed = True
+        for process, conn, _ in self._workers:
+            conn.close()
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, workers=len(self._workers), in_flight=len(self._pending))
+        stats['alive'] = sum(process.is_alive() for process, _, _ in self._workers)
+        return stats
+
+
+def _serve_connection(pool, conn):
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if message[0] == 'stats':
+                    conn.send((True, pool.stats()))
+                    continue
+                _, key, parts, op, args = message
+                if op not in OPERATIONS:
+                    conn.send((False, f"Unknown operation {op}"))
+                    continue
+                conn.send_bytes(pool.submit(key, parts, op, args).result(TIMEOUT))
+            except (EOFError, OSError):
+                return
+            except Exception as e:
+                conn.send((False, str(e)))
+
+
+def serve(address=ADDRESS, workers=WORKERS):
+    # every Streamlit script thread holds its own connection, so many can
+    # arrive together; the default backlog of one drops all but the first
+    with Listener(parse_address(address), backlog=BACKLOG, authkey=authkey(create=True)) as listener:
+        pool = WorkerPool(workers)
+        _logger.info(f"Worker service listening on {address} with {workers} workers")
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                    _logger.warning(f"Rejected a worker service connection: {e}")
+                    continue
+                threading.Thread(target=_serve_connection, args=(pool, conn), daemon=True).start()
+        finally:
+            pool.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load sessions and run the analyses in a pool of worker "
+                                                 "processes, for the Streamlit app to query.")
+    parser.add_argument('command', choices=['serve', 'stats'])
+    parser.add_argument('--address', default=ADDRESS or 'localhost:8610')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    if args.command == 'stats':
+        print(json.dumps(ServiceClient(args.address).stats(), indent=2))
+        return 0
+    serve(args.address, args.workers)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())